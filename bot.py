@@ -1,13 +1,32 @@
-from web3 import Web3
+from web3 import Web3, AsyncWeb3
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.rpc.utils import check_if_retry_on_failure
+from web3.exceptions import ContractLogicError
+from eth_abi import encode as abi_encode, decode as abi_decode
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector, keccak
 from dotenv import load_dotenv
+import aiohttp
+from aiohttp import web
 import asyncio
 import random
 import time
 import sys
 import os
 import json
+import sqlite3
+import signal
+import argparse
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 
+# Optional, only needed for YAML plan files
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 # Load environment variables
 load_dotenv()
 
@@ -15,6 +34,15 @@ load_dotenv()
 CONFIG_FILE = "satsuma_config.json"
 MAIN_CONFIG_FILE = "config.json"
 
+TOKEN_CACHE_FILE = "token_cache.json"
+HISTORY_DB_FILE = "satsuma_history.db"
+OUTBOX_DB_FILE = "satsuma_outbox.db"
+JOBS_DB_FILE = "satsuma_jobs.db"
+
+# Wallet sources in addition to PRIVATE_KEY_N environment variables
+WALLETS_FILE = "wallets.txt"
+KEYS_DIR = "keys"
+
 # Terminal Colors
 class Colors:
     RESET = '\033[0m'
@@ -833,301 +861,2381 @@ WRAPPER_ABI = [
     }
 ]
 
-class SatsumaBot:
-    def __init__(self):
-        self.config = self.load_config()
-        self.w3 = self.initialize_provider()
-        self.private_keys = self.get_private_keys()
-        self.settings = self.load_user_settings()
-        self.transaction_history = []
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"}
+                ],
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"}
+                ],
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    },
+    {
+        "inputs": [{"name": "addr", "type": "address"}],
+        "name": "getEthBalance",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    }
+]
 
-    def load_config(self):
-        config = {
-            "rpc": "https://rpc.testnet.citrea.xyz",
-            "chain_id": 5115,
-            "symbol": "cBTC",
-            "explorer": "https://explorer.testnet.citrea.xyz",
-            "swap_router": Web3.to_checksum_address("0x3012e9049d05b4b5369d690114d5a5861ebb85cb"),
-            "liquidity_router": Web3.to_checksum_address("0x55a4669cd6895EA25C174F13E1b49d69B4481704"),
-            "pool_address": Web3.to_checksum_address("0x080c376e6aB309fF1a861e1c3F91F27b8D4f1443"),
-            "usdc_address": Web3.to_checksum_address("0x2C8abD2A528D19AFc33d2eBA507c0F405c131335"),
-            "wcbtc_address": Web3.to_checksum_address("0x8d0c9d1c17ae5e40fff9be350f57840e9e66cd93"),
-            "suma_address": Web3.to_checksum_address("0xdE4251dd68e1aD5865b14Dd527E54018767Af58a"),
-            "s33_address": Web3.to_checksum_address("0xb93B80d59c2FB3eb23817d4A27841eF8788826f0"),
-            "vesuma_address": Web3.to_checksum_address("0x97a4f684620D578312Dc9fFBc4b0EbD8E804ab4a"),
-            "voting_contract": Web3.to_checksum_address("0x1234567890123456789012345678901234567891"),
-            "staking_contract": Web3.to_checksum_address("0x1234567890123456789012345678901234567892"),
-            "gauge_address": Web3.to_checksum_address("0x1234567890123456789012345678901234567893"),
-            "wrapper_address": Web3.to_checksum_address("0x8d0c9d1c17ae5e40fff9be350f57840e9e66cd93")
-        }
+class CalldataEncoder:
+    def __init__(self, signature):
+        self.signature = signature
+        self.name = signature[:signature.index("(")]
+        self.selector = function_signature_to_4byte_selector(signature)
+        self.types = self._split_types(signature[len(self.name) + 1:-1])
+
+    @staticmethod
+    def _split_types(arguments):
+        types, depth, current = [], 0, ""
+        for char in arguments:
+            if char == "," and depth == 0:
+                types.append(current)
+                current = ""
+                continue
+            depth += (char == "(") - (char == ")")
+            current += char
+        if current:
+            types.append(current)
+        return types
+
+    def encode(self, *args):
+        return self.selector + abi_encode(self.types, args)
+
+# Precompiled encoders for the hot paths, checked against the ABIs by ContractRegistry
+class Calldata:
+    EXACT_INPUT_SINGLE = CalldataEncoder("exactInputSingle((address,address,address,address,uint256,uint256,uint256,uint160))")
+    MULTICALL = CalldataEncoder("multicall(bytes[])")
+    APPROVE = CalldataEncoder("approve(address,uint256)")
+    ADD_LIQUIDITY = CalldataEncoder("addLiquidity(address,address,address,address,uint256,uint256,uint256,uint256,uint256)")
+    CREATE_LOCK = CalldataEncoder("create_lock(uint256,uint256)")
+    STAKE = CalldataEncoder("stake(uint256)")
+    VOTE = CalldataEncoder("vote(address,uint256)")
+    DEPOSIT = CalldataEncoder("deposit()")
+    WITHDRAW = CalldataEncoder("withdraw(uint256)")
+    AGGREGATE3 = CalldataEncoder("aggregate3((address,bool,bytes)[])")
+    # Skips the permit when the router's allowance already covers the value, so a replayed or raced permit cannot revert the batch
+    SELF_PERMIT_IF_NECESSARY = CalldataEncoder("selfPermitIfNecessary(address,uint256,uint256,uint8,bytes32,bytes32)")
+    REFUND_NATIVE_TOKEN = CalldataEncoder("refundNativeToken()")
+    UNWRAP_WNATIVE_TOKEN = CalldataEncoder("unwrapWNativeToken(uint256,address)")
+
+    @classmethod
+    def name_of(cls, data):
+        selector = Web3.to_bytes(hexstr=data)[:4] if isinstance(data, str) else bytes(data[:4])
+        for encoder in vars(cls).values():
+            if isinstance(encoder, CalldataEncoder) and encoder.selector == selector:
+                return encoder.name
+        return None
+
+class ContractRegistry:
+    def __init__(self, w3, config):
+        self.w3 = w3
+        self.erc20_contracts = {}
         
-        try:
-            with open(MAIN_CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=2)
-        except Exception as e:
-            log.warn(f"Could not save config file: {str(e)}")
+        # ABIs are parsed once here instead of on every operation
+        self.swap_router = w3.eth.contract(address=config["swap_router"], abi=SWAP_ROUTER_ABI)
+        self.liquidity_router = w3.eth.contract(address=config["liquidity_router"], abi=LIQUIDITY_ROUTER_ABI)
+        self.vesuma = w3.eth.contract(address=config["vesuma_address"], abi=VESUMA_ABI)
+        self.staking = w3.eth.contract(address=config["staking_contract"], abi=STAKING_ABI)
+        self.voting = w3.eth.contract(address=config["voting_contract"], abi=VOTING_ABI)
+        self.wrapper = w3.eth.contract(address=config["wrapper_address"], abi=WRAPPER_ABI)
+        self.multicall3 = w3.eth.contract(address=config["multicall3"] or config["swap_router"], abi=MULTICALL3_ABI)
         
-        return config
+        self._verify_encoders({
+            self.multicall3: [Calldata.AGGREGATE3],
+            self.swap_router: [
+                Calldata.EXACT_INPUT_SINGLE, Calldata.MULTICALL, Calldata.SELF_PERMIT_IF_NECESSARY,
+                Calldata.REFUND_NATIVE_TOKEN, Calldata.UNWRAP_WNATIVE_TOKEN
+            ],
+            self.liquidity_router: [Calldata.ADD_LIQUIDITY],
+            self.vesuma: [Calldata.CREATE_LOCK],
+            self.staking: [Calldata.STAKE],
+            self.voting: [Calldata.VOTE],
+            self.wrapper: [Calldata.DEPOSIT, Calldata.WITHDRAW],
+            self.erc20(config["usdc_address"]): [Calldata.APPROVE]
+        })
 
-    def initialize_provider(self):
-        try:
-            w3 = Web3(Web3.HTTPProvider(self.config["rpc"]))
-            if not w3.is_connected():
-                raise Exception("Failed to connect to RPC")
+    def erc20(self, address):
+        if address not in self.erc20_contracts:
+            self.erc20_contracts[address] = self.w3.eth.contract(address=address, abi=ERC20_ABI)
+        return self.erc20_contracts[address]
+
+    @staticmethod
+    def _verify_encoders(encoders_by_contract):
+        for contract, encoders in encoders_by_contract.items():
+            for encoder in encoders:
+                signature = contract.get_function_by_name(encoder.name).signature
+                if signature != encoder.signature:
+                    raise Exception(f"Calldata encoder {encoder.signature} does not match ABI {signature}")
+
+class AdaptiveLimiter:
+    # AIMD: grow the in-flight limit by ~1 per round trip while p95 latency and error rate are healthy,
+    # halve it on throttling, timeouts or sustained slow responses
+    def __init__(self, initial, minimum, maximum, latency_target, error_rate_limit, window=200):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.error_rate_limit = error_rate_limit
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.in_flight = 0
+        self.last_decrease = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            while self.in_flight >= int(self.limit):
+                await self.condition.wait()
+            self.in_flight += 1
+
+    async def release(self, latency, failed):
+        async with self.condition:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            self.outcomes.append(failed)
             
-            log.success(f"Connected to {self.config['rpc']}")
-            log.info(f"Chain ID: {self.config['chain_id']}")
-            return w3
-        except Exception as e:
-            log.error(f"Provider initialization failed: {str(e)}")
-            sys.exit(1)
+            if failed or self._unhealthy():
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
 
-    def get_private_keys(self):
-        private_keys = []
-        key = os.getenv("PRIVATE_KEY_1")
+    def p95_latency(self):
+        if not self.latencies:
+            return 0
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1 if len(ordered) >= 20 else -1]
+
+    def error_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0
+
+    def _unhealthy(self):
+        return len(self.latencies) >= 20 and (
+            self.p95_latency() > self.latency_target or self.error_rate() > self.error_rate_limit
+        )
+
+    def _decrease(self):
+        # At most one cut per latency target so a burst of failures from one moment counts once
+        now = time.monotonic()
+        if now - self.last_decrease < self.latency_target:
+            return
+        self.last_decrease = now
+        previous = int(self.limit)
+        self.limit = max(self.minimum, self.limit / 2)
+        if int(self.limit) != previous:
+            log.warn(f"RPC under pressure (p95 {self.p95_latency():.2f}s, errors {self.error_rate():.0%}), concurrency limit {previous} -> {int(self.limit)}")
+
+class BatchingHTTPProvider(AsyncWeb3.AsyncHTTPProvider):
+    # Independent reads issued within the batch window go out as one JSON-RPC batch POST
+    BATCHABLE_METHODS = {
+        "eth_blockNumber",
+        "eth_call",
+        "eth_chainId",
+        "eth_estimateGas",
+        "eth_feeHistory",
+        "eth_gasPrice",
+        "eth_getBalance",
+        "eth_getBlockByNumber",
+        "eth_getTransactionByHash",
+        "eth_getTransactionCount",
+        "eth_getTransactionReceipt",
+        "eth_maxPriorityFeePerGas"
+    }
+
+    THROTTLE_MARKERS = (b'"code":429', b'"code": 429', b"-32005", b"rate limit", b"Too Many Requests")
+
+    def __init__(self, endpoint_uri, chain_id=None, batch_window=0.01, max_batch_size=100, limiter=None, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.chain_id = chain_id
+        self.limiter = limiter
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.queue = []
+        self.flush_handle = None
+        self.flush_tasks = set()
+
+    async def make_request(self, method, params):
+        # web3 asks for the chain id before every eth_call, the configured one is authoritative
+        if method == "eth_chainId" and self.chain_id is not None:
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.chain_id)}
         
-        if not key or key == "your_private_key_here":
-            log.error("No valid private key found in environment variables")
-            log.info("Please set PRIVATE_KEY_1 in your .env file with your actual private key")
-            
-            # For demo purposes, ask for private key input
-            key = input("Enter your private key (without 0x prefix): ")
-            if not key:
-                sys.exit(1)
+        if self.batch_window <= 0 or method not in self.BATCHABLE_METHODS:
+            return await super().make_request(method, params)
         
-        try:
-            account = Web3().eth.account.from_key(key)
-            log.success(f"Loaded private key for address: {account.address}")
-            private_keys.append(key)
-        except Exception as e:
-            log.error(f"Invalid private key: {str(e)}")
-            sys.exit(1)
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((method, params, future))
         
-        return private_keys
-
-    def load_user_settings(self):
-        user_settings = {
-            "transaction_count": 0,
-            "current_round": 0,
-            "total_transactions": 0,
-            "successful_transactions": 0,
-            "failed_transactions": 0,
-            "last_transaction_time": None
-        }
+        if len(self.queue) >= self.max_batch_size:
+            self._schedule_flush(0)
+        elif self.flush_handle is None:
+            self._schedule_flush(self.batch_window)
         
-        try:
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, 'r') as f:
-                    data = json.load(f)
-                    user_settings.update(data)
-                    log.success(f"Loaded configuration: {user_settings['transaction_count']} transactions planned")
-        except Exception as e:
-            log.error(f"Failed to load settings: {str(e)}")
+        return await future
+
+    async def _make_request(self, method, request_data):
+        # Same retry behaviour as AsyncHTTPProvider, routed through _post
+        retry = self.exception_retry_configuration
+        if retry is None or not check_if_retry_on_failure(method, retry.method_allowlist):
+            return await self._post(request_data)
         
-        return user_settings
+        for attempt in range(retry.retries):
+            try:
+                return await self._post(request_data)
+            except tuple(retry.errors):
+                if attempt == retry.retries - 1:
+                    raise
+                await asyncio.sleep(retry.backoff_factor * 2 ** attempt)
 
-    def save_user_settings(self):
+    async def _post(self, request_data):
+        # Every HTTP round trip to the node passes through the adaptive limiter
+        if self.limiter is None:
+            return await self._request_session_manager.async_make_post_request(
+                self.endpoint_uri, request_data, **dict(self.get_request_kwargs())
+            )
+        
+        await self.limiter.acquire()
+        started = time.monotonic()
+        failed = True
         try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(self.settings, f, indent=2)
-            log.success("Configuration saved successfully")
-        except Exception as e:
-            log.error(f"Failed to save settings: {str(e)}")
+            raw_response = await self._request_session_manager.async_make_post_request(
+                self.endpoint_uri, request_data, **dict(self.get_request_kwargs())
+            )
+            failed = any(marker in raw_response for marker in self.THROTTLE_MARKERS)
+            return raw_response
+        finally:
+            await self.limiter.release(time.monotonic() - started, failed)
 
-    def generate_random_amount(self):
-        min_amount = 0.0001
-        max_amount = 0.0002
-        random_amount = random.uniform(min_amount, max_amount)
-        return round(random_amount, 6)
+    def _schedule_flush(self, delay):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        self.flush_handle = asyncio.get_running_loop().call_later(delay, self._start_flush)
 
-    async def approve_token(self, account, token_address, spender_address, amount):
+    def _start_flush(self):
+        task = asyncio.ensure_future(self._flush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    async def _flush(self):
+        self.flush_handle = None
+        pending, self.queue = self.queue, []
+        if not pending:
+            return
+        
+        if len(pending) == 1:
+            method, params, future = pending[0]
+            # The caller may have given up meanwhile (a hedged read that lost the race cancels its future)
+            try:
+                response = await super().make_request(method, params)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(response)
+            return
+        
+        futures_by_id = {}
+        requests = []
+        for method, params, future in pending:
+            request = self.form_request(method, params)
+            futures_by_id[request["id"]] = future
+            requests.append(self.encode_rpc_dict(request))
+        
         try:
-            token_contract = self.w3.eth.contract(address=token_address, abi=ERC20_ABI)
-            nonce = self.w3.eth.get_transaction_count(account.address)
-            
-            log.processing(f"Checking allowance for {token_address}")
-            
-            allowance = token_contract.functions.allowance(account.address, spender_address).call()
-            if allowance >= amount:
-                log.success("Sufficient allowance already exists")
-                return {"success": True, "nonce": nonce}
-            
-            log.processing("Sending approval transaction...")
-            
-            approve_tx = token_contract.functions.approve(spender_address, amount).build_transaction({
-                "from": account.address,
-                "gas": 100000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
+            raw_response = await self._post(b"[" + b",".join(requests) + b"]")
+            responses = self.decode_rpc_response(raw_response)
             
-            signed_tx = self.w3.eth.account.sign_transaction(approve_tx, private_key=account.key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            if not isinstance(responses, list):
+                # The node rejected the whole batch, every caller gets the same error
+                responses = [{**responses, "id": request_id} for request_id in futures_by_id]
             
-            log.processing("Waiting for approval confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            for response in responses:
+                future = futures_by_id.pop(response.get("id"), None)
+                if future and not future.done():
+                    future.set_result(response)
             
-            if receipt["status"] == 1:
-                log.success(f"Approval successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                return {"success": True, "nonce": nonce + 1}
-            else:
-                log.error("Approval transaction failed")
-                return {"success": False, "nonce": nonce}
-                
+            for future in futures_by_id.values():
+                if not future.done():
+                    future.set_exception(Exception("Missing response in JSON-RPC batch"))
         except Exception as e:
-            log.error(f"Approval error: {str(e)}")
-            return {"success": False, "nonce": nonce if 'nonce' in locals() else 0}
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
 
-    async def get_token_balance(self, token_address, account_address):
+class EndpointHealth:
+    # Rolling latency / error picture of one RPC endpoint used to rank it against the others
+    def __init__(self, window=100, failure_threshold=3, cooldown=10):
+        self.latency = None
+        self.outcomes = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.down_until = 0
+        self.bench_time = cooldown
+
+    def record(self, latency, failed):
+        # Returns True when the endpoint has just been benched
+        self.outcomes.append(failed)
+        if failed and self.latency is not None:
+            # A failure never makes the endpoint look faster than it was; a timeout drags its latency up
+            latency = max(latency, self.latency)
+        self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+        if not failed:
+            self.consecutive_failures = 0
+            self.bench_time = self.cooldown
+            return False
+        
+        self.consecutive_failures += 1
+        if self.consecutive_failures < self.failure_threshold or not self.available():
+            return False
+        # Past the threshold every failure outside a cooldown benches it again, twice as long each time
+        if self.consecutive_failures > self.failure_threshold:
+            self.bench_time = min(self.bench_time * 2, self.cooldown * 32)
+        self.down_until = time.monotonic() + self.bench_time
+        return True
+
+    def error_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0
+
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def score(self, limiter):
+        # Lower is better: expected latency, inflated by recent errors and by how saturated the endpoint is
+        latency = self.latency if self.latency is not None else 0.1
+        load = limiter.in_flight / max(1, int(limiter.limit)) if limiter else 0
+        return latency * (1 + 10 * self.error_rate()) * (1 + load)
+
+class RPCPoolProvider(AsyncBaseProvider):
+    # Routes every request to the healthiest of several BatchingHTTPProviders and fails over on errors
+    THROTTLE_CODES = (429, -32005)
+    ALREADY_KNOWN_MARKERS = ("already known", "known transaction", "alreadyknown", "already imported")
+
+    def __init__(self, endpoints, hedge_reads=False, hedge_min_delay=0.2, failure_threshold=3, cooldown=10, broadcast=False):
+        super().__init__()
+        self.endpoints = endpoints
+        self.broadcast = broadcast
+        self.broadcast_tasks = set()
+        self.health = {
+            endpoint.endpoint_uri: EndpointHealth(failure_threshold=failure_threshold, cooldown=cooldown)
+            for endpoint in endpoints
+        }
+        self.hedge_reads = hedge_reads
+        self.hedge_min_delay = hedge_min_delay
+
+    @property
+    def endpoint_uri(self):
+        return self.ranked()[0].endpoint_uri
+
+    def ranked(self):
+        # Endpoints in cooldown go last but are still tried when everything else fails
+        return sorted(self.endpoints, key=lambda endpoint: (
+            not self.health[endpoint.endpoint_uri].available(),
+            self.health[endpoint.endpoint_uri].score(endpoint.limiter)
+        ))
+
+    async def make_request(self, method, params):
+        ranked = self.ranked()
+        if self.broadcast and len(ranked) > 1 and method == "eth_sendRawTransaction":
+            return await self._broadcast(ranked, method, params)
+        if self.hedge_reads and len(ranked) > 1 and method in BatchingHTTPProvider.BATCHABLE_METHODS:
+            return await self._hedged(ranked, method, params)
+        return await self._with_failover(ranked, method, params)
+
+    async def _call(self, endpoint, method, params):
+        health = self.health[endpoint.endpoint_uri]
+        started = time.monotonic()
         try:
-            token_contract = self.w3.eth.contract(address=token_address, abi=ERC20_ABI)
-            balance = token_contract.functions.balanceOf(account_address).call()
-            decimals = token_contract.functions.decimals().call()
-            symbol = token_contract.functions.symbol().call()
-            
-            return {
-                "balance": balance,
-                "decimals": decimals,
-                "symbol": symbol,
-                "formatted": balance / (10 ** decimals)
-            }
+            response = await endpoint.make_request(method, params)
         except Exception as e:
-            log.error(f"Error getting token balance: {str(e)}")
-            return None
+            self._record_failure(endpoint, time.monotonic() - started, e)
+            raise
+        
+        error = response.get("error") if isinstance(response, dict) else None
+        if isinstance(error, dict) and error.get("code") in self.THROTTLE_CODES:
+            self._record_failure(endpoint, time.monotonic() - started, error.get("message"))
+            raise Exception(f"{endpoint.endpoint_uri} throttled: {error.get('message')}")
+        
+        health.record(time.monotonic() - started, False)
+        
+        # A node that already has the transaction (from another endpoint or a retry) counts as accepted
+        if method == "eth_sendRawTransaction" and isinstance(error, dict):
+            message = str(error.get("message", "")).lower()
+            if any(marker in message for marker in self.ALREADY_KNOWN_MARKERS):
+                raw_transaction = bytes.fromhex(params[0][2:] if isinstance(params[0], str) else bytes(params[0]).hex())
+                return {"jsonrpc": "2.0", "id": response.get("id"), "result": "0x" + keccak(raw_transaction).hex()}
+        return response
 
-    async def perform_swap(self, private_key, token_in, token_out, amount_in):
+    def _record_failure(self, endpoint, latency, error):
+        health = self.health[endpoint.endpoint_uri]
+        if health.record(latency, True):
+            log.warn(f"RPC endpoint {endpoint.endpoint_uri} benched for {health.bench_time}s after {health.consecutive_failures} failures: {error}")
+
+    async def _with_failover(self, ranked, method, params):
+        last_error = None
+        for endpoint in ranked:
+            try:
+                return await self._call(endpoint, method, params)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _hedged(self, ranked, method, params):
+        # Send the read to a second endpoint if the first has not answered within its own p95 latency
+        primary = asyncio.ensure_future(self._call(ranked[0], method, params))
+        delay = max(self.hedge_min_delay, ranked[0].limiter.p95_latency() if ranked[0].limiter else 0)
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        
+        if done and primary.exception() is None:
+            return primary.result()
+        if done:
+            return await self._with_failover(ranked[1:], method, params)
+        
+        pending = {primary, asyncio.ensure_future(self._with_failover(ranked[1:], method, params))}
+        last_error = None
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
-            log.info(f"Performing swap for {account.address}")
-            
-            token_in_info = await self.get_token_balance(token_in, account.address)
-            if not token_in_info:
-                return {"success": False, "error": "Could not get token in info"}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
 
-            amount_in_wei = int(amount_in * (10 ** token_in_info['decimals']))
-            
-            # Approve token first
-            approval_result = await self.approve_token(account, token_in, self.config["swap_router"], amount_in_wei)
-            if not approval_result["success"]:
-                return {"success": False, "error": "Approval failed"}
-            
-            # Prepare swap transaction
-            swap_contract = self.w3.eth.contract(address=self.config["swap_router"], abi=SWAP_ROUTER_ABI)
-            
-            deadline = int(time.time()) + 300  # 5 minutes
-            
-            # Use a tuple for parameters to match the ABI structure
-            swap_params = (
-                token_in,
-                token_out,
-                self.w3.to_checksum_address("0x0000000000000000000000000000000000000000"), #deployer can be a zero address if not used
-                account.address,
-                deadline,
-                amount_in_wei,
-                0,
-                0
-            )
+    async def _broadcast(self, ranked, method, params):
+        # Push the signed transaction to every endpoint at once, the first accepted hash wins
+        pending = {asyncio.ensure_future(self._call(endpoint, method, params)) for endpoint in ranked}
+        first_error_response = None
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif "result" in task.result():
+                    # Slower endpoints keep going so the transaction still propagates through their mempools
+                    for remaining in pending:
+                        self.broadcast_tasks.add(remaining)
+                        remaining.add_done_callback(self._discard_broadcast)
+                    return task.result()
+                elif first_error_response is None:
+                    first_error_response = task.result()
+        
+        if first_error_response is not None:
+            return first_error_response
+        raise last_error
 
-            nonce = approval_result["nonce"]
-            
-            # Encode the `exactInputSingle` call using the correct method
-            encoded_swap_call = swap_contract.functions.exactInputSingle(swap_params)._encode_transaction_data()
-            
-            # Build the `multicall` transaction with the encoded swap call
-            multicall_tx = swap_contract.functions.multicall([encoded_swap_call]).build_transaction({
-                "from": account.address,
-                "gas": 400000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(multicall_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            
-            log.processing("Waiting for swap confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if receipt["status"] == 1:
-                log.success(f"Swap successful via multicall! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "multicall_swap",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
-                return {"success": True, "tx_hash": tx_hash.hex()}
-            else:
-                log.error("Multicall swap transaction failed")
-                return {"success": False, "error": "Transaction failed"}
-                
-        except Exception as e:
-            log.error(f"Multicall swap error: {str(e)}")
-            return {"success": False, "error": str(e)}
+    def _discard_broadcast(self, task):
+        self.broadcast_tasks.discard(task)
+        if not task.cancelled():
+            task.exception()
 
-    async def add_liquidity(self, private_key, token_a, token_b, amount_a, amount_b):
+    async def cache_async_session(self, connector_limit, timeout):
+        for endpoint in self.endpoints:
+            await endpoint.cache_async_session(aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=connector_limit),
+                timeout=timeout
+            ))
+
+    async def reachable_endpoints(self):
+        results = await asyncio.gather(
+            *[endpoint.is_connected() for endpoint in self.endpoints],
+            return_exceptions=True
+        )
+        return [endpoint.endpoint_uri for endpoint, result in zip(self.endpoints, results) if result is True]
+
+    async def is_connected(self, show_traceback=False):
+        return bool(await self.reachable_endpoints())
+
+    async def disconnect(self):
+        for endpoint in self.endpoints:
+            await endpoint.disconnect()
+
+class MulticallReader:
+    BALANCE_OF = function_signature_to_4byte_selector("balanceOf(address)")
+    ALLOWANCE = function_signature_to_4byte_selector("allowance(address,address)")
+    DECIMALS = function_signature_to_4byte_selector("decimals()")
+    SYMBOL = function_signature_to_4byte_selector("symbol()")
+    GET_ETH_BALANCE = function_signature_to_4byte_selector("getEthBalance(address)")
+    DOMAIN_SEPARATOR = function_signature_to_4byte_selector("DOMAIN_SEPARATOR()")
+    NAME = function_signature_to_4byte_selector("name()")
+    VERSION = function_signature_to_4byte_selector("version()")
+    NONCES = function_signature_to_4byte_selector("nonces(address)")
+
+    def __init__(self, w3, multicall_address, batch_size=500, retry_after=30):
+        self.w3 = w3
+        self.batch_size = batch_size
+        self.multicall = multicall_address
+        self.retry_after = retry_after
+        self.retry_at = 0
+        # Single-call fallback keeps at most one multicall chunk's worth of calls in flight
+        self.fallback_semaphore = asyncio.Semaphore(batch_size)
+
+    async def aggregate(self, calls, strict=False):
+        # calls: list of (target, calldata, output_types), target None means native balance of the encoded address.
+        # A reverted call or undecodable answer reads as None; with strict an RPC failure raises instead of reading as None
+        if self.multicall and time.monotonic() >= self.retry_at:
+            try:
+                chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+                results = await asyncio.gather(*[self._aggregate_chunk(chunk) for chunk in chunks])
+                return [value for chunk in results for value in chunk]
+            except Exception as e:
+                if await self._multicall_missing(e):
+                    log.warn(f"Multicall3 unavailable, falling back to single calls: {str(e)}")
+                    self.multicall = None
+                else:
+                    # Transient (timeout, throttling, node error): single calls for now, multicall again after retry_after
+                    log.warn(f"Multicall3 call failed, using single calls for {self.retry_after}s: {str(e)}")
+                    self.retry_at = time.monotonic() + self.retry_after
+        
+        return await asyncio.gather(*[self._single_call(target, calldata, output_types, strict) for target, calldata, output_types in calls])
+
+    async def _multicall_missing(self, error):
+        # Only a contract that is not deployed or answers with undecodable data disables multicall for good
+        if isinstance(error, DecodingError):
+            return True
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
-            log.info(f"Adding liquidity for {account.address}")
-            
-            amount_a_wei = int(amount_a * 10**18)
-            amount_b_wei = int(amount_b * 10**18)
-            
-            # Approve both tokens
-            approval_a = await self.approve_token(account, token_a, self.config["liquidity_router"], amount_a_wei)
-            if not approval_a["success"]:
-                return {"success": False, "error": "Token A approval failed"}
-            
-            approval_b = await self.approve_token(account, token_b, self.config["liquidity_router"], amount_b_wei)
-            if not approval_b["success"]:
-                return {"success": False, "error": "Token B approval failed"}
-            
-            # Add liquidity
-            liquidity_contract = self.w3.eth.contract(address=self.config["liquidity_router"], abi=LIQUIDITY_ROUTER_ABI)
-            
-            deadline = int(time.time()) + 300
-            nonce = self.w3.eth.get_transaction_count(account.address)
-            
-            liquidity_tx = liquidity_contract.functions.addLiquidity(
-                token_a, token_b, account.address, account.address,
-                amount_a_wei, amount_b_wei, 0, 0, deadline
-            ).build_transaction({
-                "from": account.address,
-                "gas": 400000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(liquidity_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            
-            log.processing("Waiting for liquidity confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if receipt["status"] == 1:
-                log.success(f"Liquidity added successfully! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "liquidity",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
-                return {"success": True, "tx_hash": tx_hash.hex()}
+            return not await self.w3.eth.get_code(self.multicall)
+        except Exception:
+            return False
+
+    async def _aggregate_chunk(self, calls):
+        packed = []
+        for target, calldata, output_types in calls:
+            if target is None:
+                packed.append((self.multicall, True, self.GET_ETH_BALANCE + calldata))
             else:
-                log.error("Liquidity transaction failed")
-                return {"success": False, "error": "Transaction failed"}
-                
-        except Exception as e:
-            log.error(f"Liquidity error: {str(e)}")
-            return {"success": False, "error": str(e)}
+                packed.append((target, True, calldata))
+        
+        return_data = await self.w3.eth.call({"to": self.multicall, "data": Calldata.AGGREGATE3.encode(packed)})
+        responses = abi_decode(["(bool,bytes)[]"], return_data)[0]
+        return [
+            self._decode(output_types, return_data) if success else None
+            for (success, return_data), (_, _, output_types) in zip(responses, calls)
+        ]
 
-    async def convert_to_vesuma(self, private_key, amount, lock_time_days):
+    async def _single_call(self, target, calldata, output_types, strict=False):
+        async with self.fallback_semaphore:
+            try:
+                if target is None:
+                    return await self.w3.eth.get_balance(Web3.to_checksum_address(abi_decode(["address"], calldata)[0]))
+                return_data = await self.w3.eth.call({"to": target, "data": calldata})
+                return self._decode(output_types, return_data)
+            except ContractLogicError:
+                return None
+            except Exception:
+                if strict:
+                    raise
+                return None
+
+    @staticmethod
+    def _decode(output_types, return_data):
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
-            log.info(f"Converting SUMA to veSUMA for {account.address}")
-            
+            return abi_decode(output_types, return_data)[0]
+        except Exception:
+            return None
+
+    async def get_balances(self, owners, tokens):
+        calls = []
+        for owner in owners:
+            calls.append((None, abi_encode(["address"], [owner]), ["uint256"]))
+            for token in tokens:
+                calls.append((token, self.BALANCE_OF + abi_encode(["address"], [owner]), ["uint256"]))
+        
+        results = iter(await self.aggregate(calls))
+        balances = {}
+        for owner in owners:
+            balances[owner] = {"native": next(results)}
+            for token in tokens:
+                balances[owner][token] = next(results)
+        return balances
+
+    async def get_allowances(self, requests):
+        # requests: list of (owner, token, spender)
+        calls = [
+            (token, self.ALLOWANCE + abi_encode(["address", "address"], [owner, spender]), ["uint256"])
+            for owner, token, spender in requests
+        ]
+        return dict(zip(requests, await self.aggregate(calls)))
+
+    async def get_metadata(self, tokens):
+        calls = []
+        for token in tokens:
+            calls.append((token, self.DECIMALS, ["uint8"]))
+            calls.append((token, self.SYMBOL, ["string"]))
+        
+        results = iter(await self.aggregate(calls))
+        return {token: {"decimals": next(results), "symbol": next(results)} for token in tokens}
+
+    async def get_permit_info(self, token):
+        # Strict: the result is cached per token, so a failed read must not look like a token without permit
+        domain_separator, name, version = await self.aggregate([
+            (token, self.DOMAIN_SEPARATOR, ["bytes32"]),
+            (token, self.NAME, ["string"]),
+            (token, self.VERSION, ["string"])
+        ], strict=True)
+        return {"domain_separator": domain_separator, "name": name, "version": version}
+
+    async def get_permit_nonce(self, token, owner):
+        (nonce,) = await self.aggregate([(token, self.NONCES + abi_encode(["address"], [owner]), ["uint256"])])
+        return nonce
+
+MAX_UINT256 = 2**256 - 1
+
+# Token placeholder for native cBTC in swap legs, routed through WCBTC inside the router multicall
+NATIVE_TOKEN = "native"
+
+class AllowanceCache:
+    def __init__(self, reader):
+        self.reader = reader
+        self.allowances = {}
+
+    async def get_many(self, requests):
+        missing = [request for request in requests if request not in self.allowances]
+        if missing:
+            for request, allowance in (await self.reader.get_allowances(missing)).items():
+                if allowance is not None:
+                    self.allowances[request] = allowance
+        return {request: self.allowances.get(request) for request in requests}
+
+    async def get(self, owner, token, spender):
+        return (await self.get_many([(owner, token, spender)]))[(owner, token, spender)]
+
+    def set(self, owner, token, spender, amount):
+        self.allowances[(owner, token, spender)] = amount
+
+    def spend(self, owner, token, spender, amount):
+        allowance = self.allowances.get((owner, token, spender))
+        # Tokens treat a max approval as infinite and never decrease it
+        if allowance is not None and allowance != MAX_UINT256:
+            self.allowances[(owner, token, spender)] = max(allowance - amount, 0)
+
+    def invalidate(self, owner, token, spender):
+        self.allowances.pop((owner, token, spender), None)
+
+class NonceManager:
+    def __init__(self, w3):
+        self.w3 = w3
+        self.next_nonces = {}
+        self.locks = {}
+
+    def _lock(self, address):
+        if address not in self.locks:
+            self.locks[address] = asyncio.Lock()
+        return self.locks[address]
+
+    async def allocate(self, address):
+        async with self._lock(address):
+            if address not in self.next_nonces:
+                self.next_nonces[address] = await self.w3.eth.get_transaction_count(address, "pending")
+            nonce = self.next_nonces[address]
+            self.next_nonces[address] = nonce + 1
+            return nonce
+
+    async def release(self, address, nonce):
+        # Called when a nonce was handed out but its transaction never reached the node
+        async with self._lock(address):
+            if self.next_nonces.get(address) == nonce + 1:
+                self.next_nonces[address] = nonce
+            else:
+                # Later nonces are already out, resync from chain to fill the gap
+                self.next_nonces.pop(address, None)
+
+    def reset(self, address):
+        self.next_nonces.pop(address, None)
+
+class TokenRegistry:
+    def __init__(self, reader, seed_tokens):
+        self.reader = reader
+        self.tokens = {}
+        self.pending = {}
+        
+        # Config tokens are known up front, their metadata is resolved once and kept on disk
+        for symbol, address in seed_tokens.items():
+            self.tokens[address] = {"symbol": symbol}
+        
+        try:
+            if os.path.exists(TOKEN_CACHE_FILE):
+                with open(TOKEN_CACHE_FILE, 'r') as f:
+                    for address, metadata in json.load(f).items():
+                        self.tokens[Web3.to_checksum_address(address)] = metadata
+        except Exception as e:
+            log.warn(f"Could not load token cache: {str(e)}")
+
+    async def get(self, address):
+        address = Web3.to_checksum_address(address)
+        metadata = self.tokens.get(address)
+        if metadata and "decimals" in metadata:
+            return metadata
+        
+        # Concurrent lookups of the same unknown token share one fetch
+        if address not in self.pending:
+            self.pending[address] = asyncio.ensure_future(self._fetch(address))
+        try:
+            return await self.pending[address]
+        finally:
+            self.pending.pop(address, None)
+
+    async def get_many(self, addresses):
+        addresses = [Web3.to_checksum_address(address) for address in addresses]
+        missing = [address for address in addresses if "decimals" not in self.tokens.get(address, {})]
+        if missing:
+            for address, metadata in (await self.reader.get_metadata(missing)).items():
+                self._store(address, metadata)
+            self.save()
+        return {address: self.tokens.get(address) for address in addresses}
+
+    async def _fetch(self, address):
+        metadata = (await self.reader.get_metadata([address]))[address]
+        self._store(address, metadata)
+        self.save()
+        if "decimals" not in self.tokens[address]:
+            raise Exception(f"Could not read token metadata for {address}")
+        return self.tokens[address]
+
+    async def get_permit_domain(self, address, chain_id):
+        # EIP-2612 support is detected once per token: the rebuilt EIP-712 domain must match DOMAIN_SEPARATOR()
+        address = Web3.to_checksum_address(address)
+        metadata = self.tokens.setdefault(address, {})
+        if "permit" in metadata:
+            return metadata["permit"]
+        
+        # Concurrent lookups share one in-flight detection; the result is cached only once it is known
+        key = (address, "permit")
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(self._fetch_permit_domain(address, chain_id))
+        try:
+            return await self.pending[key]
+        finally:
+            self.pending.pop(key, None)
+
+    async def _fetch_permit_domain(self, address, chain_id):
+        # Raises when the reads fail, so only a token that really lacks a matching DOMAIN_SEPARATOR is cached as None
+        info = await self.reader.get_permit_info(address)
+        permit = None
+        if info["domain_separator"] and info["name"]:
+            versions = [info["version"]] if info["version"] else ["1", "2"]
+            for version in versions:
+                domain = {"name": info["name"], "version": version, "chainId": chain_id, "verifyingContract": address}
+                if self._domain_separator(domain) == info["domain_separator"]:
+                    permit = domain
+                    break
+        self.tokens.setdefault(address, {})["permit"] = permit
+        self.save()
+        return permit
+
+    @staticmethod
+    def _domain_separator(domain):
+        type_hash = keccak(text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)")
+        return keccak(abi_encode(
+            ["bytes32", "bytes32", "bytes32", "uint256", "address"],
+            [type_hash, keccak(text=domain["name"]), keccak(text=domain["version"]), domain["chainId"], domain["verifyingContract"]]
+        ))
+
+    def _store(self, address, metadata):
+        if metadata["decimals"] is None:
+            return
+        symbol = metadata["symbol"] or self.tokens.get(address, {}).get("symbol", address[:10])
+        self.tokens.setdefault(address, {}).update({"symbol": symbol, "decimals": metadata["decimals"]})
+
+    def save(self):
+        try:
+            resolved = {address: metadata for address, metadata in self.tokens.items() if "decimals" in metadata}
+            write_json_atomic(TOKEN_CACHE_FILE, resolved)
+        except Exception as e:
+            log.warn(f"Could not save token cache: {str(e)}")
+
+def write_json_atomic(path, data):
+    # Readers only ever see the old file or the complete new one, never a half-written file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+# Bytes read from stdin past the last returned line
+_stdin_buffer = bytearray()
+
+def _read_stdin_line():
+    # Raw reads: unlike input(), a thread blocked here holds no lock on sys.stdin, so exit is never held up
+    while b"\n" not in _stdin_buffer:
+        chunk = os.read(sys.stdin.fileno(), 4096)
+        if not chunk:
+            if not _stdin_buffer:
+                raise EOFError
+            break
+        _stdin_buffer.extend(chunk)
+    line, _, rest = bytes(_stdin_buffer).partition(b"\n")
+    _stdin_buffer[:] = rest
+    return line.decode(errors="replace").rstrip("\r")
+
+async def ainput(prompt=""):
+    # Reads a line on a daemon thread so the receipt tracker, gas oracle, checkpoint and outbox recovery keep
+    # running while the menu waits
+    print(prompt, end="", flush=True)
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+    
+    def read():
+        try:
+            value = _read_stdin_line()
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(resolve, future.set_result, value)
+    
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+class Checkpoint:
+    # Write-behind run state: the hot path only marks it dirty, a background task flushes it atomically
+    def __init__(self, path, state, flush_interval):
+        self.path = path
+        self.state = state
+        self.flush_interval = flush_interval
+        self.dirty = False
+        self.task = None
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            write_json_atomic(self.path, self.state)
+        except Exception as e:
+            self.dirty = True
+            log.warn(f"Could not write checkpoint: {str(e)}")
+
+class GasOracle:
+    def __init__(self, w3, config):
+        self.w3 = w3
+        self.mode = config["fee_mode"]
+        self.refresh_interval = config["fee_refresh_interval"]
+        self.history_blocks = config["fee_history_blocks"]
+        self.priority_percentile = config["fee_priority_percentile"]
+        self.base_fee_multiplier = config["base_fee_multiplier"]
+        self.fees = None
+        self.updated_at = 0
+        self.lock = asyncio.Lock()
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                log.warn(f"Gas oracle refresh failed: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def get_fees(self):
+        # Served from memory; only fetched inline before the first refresh or if the refresher has stalled
+        if self.fees is None or time.monotonic() - self.updated_at > self.refresh_interval * 3:
+            async with self.lock:
+                if self.fees is None or time.monotonic() - self.updated_at > self.refresh_interval * 3:
+                    await self._update()
+        return self.fees
+
+    async def refresh(self):
+        async with self.lock:
+            await self._update()
+
+    async def _update(self):
+        fees = None
+        if self.mode == "eip1559":
+            try:
+                fees = await self._eip1559_fees()
+            except Exception as e:
+                log.warn(f"EIP-1559 fee estimation failed, using legacy gas price: {str(e)}")
+        if fees is None:
+            fees = {"gasPrice": await self.w3.eth.gas_price}
+        self.fees = fees
+        self.updated_at = time.monotonic()
+
+    async def _eip1559_fees(self):
+        history = await self.w3.eth.fee_history(self.history_blocks, "latest", [self.priority_percentile])
+        base_fee = history["baseFeePerGas"][-1] if history.get("baseFeePerGas") else 0
+        if not base_fee:
+            return None
+        
+        rewards = sorted(reward[0] for reward in history.get("reward", []) if reward)
+        if rewards:
+            priority_fee = rewards[len(rewards) // 2]
+        else:
+            priority_fee = await self.w3.eth.max_priority_fee
+        
+        return {
+            "maxFeePerGas": int(base_fee * self.base_fee_multiplier) + priority_fee,
+            "maxPriorityFeePerGas": priority_fee
+        }
+
+class ReceiptTracker:
+    def __init__(self, w3, config):
+        self.w3 = w3
+        self.poll_interval = config["block_poll_interval"]
+        self.confirmations = config["confirmations"]
+        self.pending = {}
+        self.head = None
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._watch_blocks())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def wait(self, tx_hash, timeout=None):
+        future = asyncio.get_running_loop().create_future()
+        entry = self.pending.setdefault(bytes(tx_hash), {"futures": [], "receipt": None})
+        entry["futures"].append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if not future.done() or future.cancelled():
+                entry["futures"].remove(future)
+                if not entry["futures"]:
+                    self.pending.pop(bytes(tx_hash), None)
+
+    async def _watch_blocks(self):
+        while True:
+            try:
+                block_number = await self.w3.eth.block_number
+                if block_number != self.head:
+                    self.head = block_number
+                    if self.pending:
+                        await self._check_pending()
+            except Exception as e:
+                log.warn(f"Receipt tracker error: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _check_pending(self):
+        tx_hashes = list(self.pending)
+        # Issued together so the provider sends them as one JSON-RPC batch
+        receipts = await asyncio.gather(
+            *[self.w3.eth.get_transaction_receipt(tx_hash) for tx_hash in tx_hashes],
+            return_exceptions=True
+        )
+        
+        for tx_hash, receipt in zip(tx_hashes, receipts):
+            entry = self.pending.get(tx_hash)
+            if entry is None:
+                continue
+            
+            if isinstance(receipt, Exception) or receipt is None:
+                if entry["receipt"] is not None:
+                    log.warn(f"Transaction 0x{tx_hash.hex()} dropped out of block {entry['receipt']['blockNumber']} (reorg)")
+                    entry["receipt"] = None
+                continue
+            
+            if entry["receipt"] is not None and entry["receipt"]["blockHash"] != receipt["blockHash"]:
+                log.warn(f"Transaction 0x{tx_hash.hex()} moved to block {receipt['blockNumber']} (reorg)")
+            entry["receipt"] = receipt
+            
+            if self.head - receipt["blockNumber"] + 1 >= self.confirmations:
+                self.pending.pop(tx_hash, None)
+                for future in entry["futures"]:
+                    if not future.done():
+                        future.set_result(receipt)
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60 if rate_per_minute else None
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        # FIFO lock so waiting wallets are served in arrival order
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate is None:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class TransactionBuilder:
+    def __init__(self, chain_id, nonce_manager, gas_oracle):
+        self.chain_id = chain_id
+        self.nonce_manager = nonce_manager
+        self.gas_oracle = gas_oracle
+
+    async def build(self, address, to, data, gas, value=0):
+        # Every field comes from config or local state, only cold caches touch the network
+        fees = await self.gas_oracle.get_fees()
+        nonce = await self.nonce_manager.allocate(address)
+        return {
+            "to": to,
+            "data": data,
+            "value": value,
+            "gas": gas,
+            "chainId": self.chain_id,
+            "nonce": nonce,
+            **fees
+        }
+
+class TransactionHistory:
+    # Every attempt (successful, reverted or errored) is appended to SQLite, nothing is kept in memory
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp REAL NOT NULL,
+                type TEXT NOT NULL,
+                wallet TEXT NOT NULL,
+                status TEXT NOT NULL,
+                tx_hash TEXT,
+                tokens TEXT,
+                amounts TEXT,
+                gas_used INTEGER,
+                block_number INTEGER,
+                latency REAL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_transactions_wallet ON transactions (wallet, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions (type, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (status, timestamp);
+        """)
+        self.db.commit()
+
+    def record(self, tx_type, wallet, status, tx_hash=None, tokens=None, amounts=None, gas_used=None, block_number=None, latency=None, error=None):
+        self.db.execute(
+            "INSERT INTO transactions (timestamp, type, wallet, status, tx_hash, tokens, amounts, gas_used, block_number, latency, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                time.time(), tx_type, wallet, status, tx_hash,
+                json.dumps(tokens) if tokens is not None else None,
+                json.dumps(amounts) if amounts is not None else None,
+                gas_used, block_number, latency, error
+            )
+        )
+        self.db.commit()
+
+    def _where(self, wallet=None, tx_type=None, status=None, since=None, until=None):
+        clauses = []
+        args = []
+        for column, value in (("wallet", wallet), ("type", tx_type), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            args.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    def query(self, wallet=None, tx_type=None, status=None, since=None, until=None, before_id=None, limit=10):
+        # Newest first, keyset-paginated on id so deep pages cost the same as the first
+        where, args = self._where(wallet, tx_type, status, since, until)
+        if before_id is not None:
+            where += (" AND " if where else " WHERE ") + "id < ?"
+            args.append(before_id)
+        rows = self.db.execute(f"SELECT * FROM transactions{where} ORDER BY id DESC LIMIT ?", args + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def pages(self, page_size=10, **filters):
+        before_id = None
+        while True:
+            page = self.query(before_id=before_id, limit=page_size, **filters)
+            if not page:
+                return
+            yield page
+            before_id = page[-1]["id"]
+
+    def count(self, wallet=None, tx_type=None, status=None, since=None, until=None):
+        where, args = self._where(wallet, tx_type, status, since, until)
+        return self.db.execute(f"SELECT COUNT(*) FROM transactions{where}", args).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+class Outbox:
+    # Signed transactions are written here before broadcast so a restart can finish what was in flight
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                tx_hash TEXT PRIMARY KEY,
+                wallet TEXT NOT NULL,
+                nonce INTEGER NOT NULL,
+                raw TEXT NOT NULL,
+                intent TEXT,
+                status TEXT NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, wallet, nonce);
+        """)
+        self.db.commit()
+
+    def add(self, tx_hash, wallet, nonce, raw, intent):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO outbox (tx_hash, wallet, nonce, raw, intent, status, created, updated) VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+            (tx_hash, wallet, nonce, raw, json.dumps(intent), now, now)
+        )
+        self.db.commit()
+
+    def finalize(self, tx_hash, status):
+        self.db.execute("UPDATE outbox SET status = ?, updated = ? WHERE tx_hash = ?", (status, time.time(), tx_hash))
+        self.db.commit()
+
+    def pending(self):
+        rows = self.db.execute("SELECT * FROM outbox WHERE status = 'pending' ORDER BY wallet, nonce").fetchall()
+        return [dict(row) for row in rows]
+
+    def prune(self, max_age):
+        self.db.execute("DELETE FROM outbox WHERE status != 'pending' AND updated < ?", (time.time() - max_age,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+class JobQueue:
+    # Durable queue of bot operations: higher priority first, one running job per wallet, failed jobs retried
+    # with exponential backoff and dead-lettered after max_attempts
+    KINDS = ("swap", "liquidity", "lock", "stake", "vote", "wrap", "unwrap")
+
+    def __init__(self, path, backoff_base=5, backoff_max=300):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                wallet TEXT NOT NULL,
+                params TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                dedupe_key TEXT UNIQUE,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority DESC, id);
+            CREATE INDEX IF NOT EXISTS idx_jobs_wallet ON jobs (wallet, status);
+        """)
+        self.db.commit()
+
+    def enqueue(self, kind, wallet, params, priority=0, dedupe_key=None, max_attempts=3):
+        # Returns (job id, created); a known dedupe_key returns the existing job instead of adding another
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO jobs (kind, wallet, params, priority, dedupe_key, status, max_attempts, available_at, created, updated) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (kind, wallet, json.dumps(params), priority, dedupe_key, max_attempts, now, now, now)
+        )
+        self.db.commit()
+        if cursor.rowcount:
+            return cursor.lastrowid, True
+        return self.db.execute("SELECT id FROM jobs WHERE dedupe_key = ?", (dedupe_key,)).fetchone()[0], False
+
+    def claim(self, dedupe_prefix=None):
+        # A wallet with a running job or a job waiting out its backoff is skipped, so its jobs run in order;
+        # dedupe_prefix limits the claim to one group of jobs (a plan run)
+        now = time.time()
+        row = self.db.execute("""
+            SELECT * FROM jobs
+            WHERE status = 'queued' AND available_at <= ?
+              AND (? IS NULL OR substr(dedupe_key, 1, length(?)) = ?)
+              AND wallet NOT IN (
+                  SELECT wallet FROM jobs WHERE status = 'running' OR (status = 'queued' AND available_at > ?)
+              )
+            ORDER BY priority DESC, id
+            LIMIT 1
+        """, (now, dedupe_prefix, dedupe_prefix, dedupe_prefix, now)).fetchone()
+        if row is None:
+            return None
+        self.db.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+            (now, row["id"])
+        )
+        self.db.commit()
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["attempts"] += 1
+        return job
+
+    def complete(self, job_id, result):
+        self.db.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, updated = ? WHERE id = ?",
+            (json.dumps(result), time.time(), job_id)
+        )
+        self.db.commit()
+
+    def fail(self, job, error):
+        # Returns the job's new status: 'queued' for another attempt or 'dead'
+        now = time.time()
+        if job["attempts"] >= job["max_attempts"]:
+            status, available_at = "dead", now
+        else:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (job["attempts"] - 1))
+            status, available_at = "queued", now + delay * random.uniform(0.8, 1.2)
+        self.db.execute(
+            "UPDATE jobs SET status = ?, available_at = ?, error = ?, updated = ? WHERE id = ?",
+            (status, available_at, error, now, job["id"])
+        )
+        self.db.commit()
+        return status
+
+    def bury(self, job_id, error):
+        self.db.execute("UPDATE jobs SET status = 'dead', error = ?, updated = ? WHERE id = ?", (error, time.time(), job_id))
+        self.db.commit()
+
+    def recover(self):
+        # Jobs that were running when the process died go back to the queue
+        cursor = self.db.execute("UPDATE jobs SET status = 'queued', updated = ? WHERE status = 'running'", (time.time(),))
+        self.db.commit()
+        return cursor.rowcount
+
+    def retry_dead(self, dedupe_prefix=None):
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated = ? "
+            "WHERE status = 'dead' AND (? IS NULL OR substr(dedupe_key, 1, length(?)) = ?)",
+            (time.time(), time.time(), dedupe_prefix, dedupe_prefix, dedupe_prefix)
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def get(self, job_id):
+        row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self, dedupe_prefix=None):
+        if dedupe_prefix is None:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return dict(self.db.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE substr(dedupe_key, 1, ?) = ? GROUP BY status",
+            (len(dedupe_prefix), dedupe_prefix)
+        ).fetchall())
+
+    def latest_key(self, dedupe_prefix):
+        row = self.db.execute(
+            "SELECT dedupe_key FROM jobs WHERE substr(dedupe_key, 1, ?) = ? ORDER BY id DESC LIMIT 1",
+            (len(dedupe_prefix), dedupe_prefix)
+        ).fetchone()
+        return row[0] if row else None
+
+    def next_available(self):
+        return self.db.execute("SELECT MIN(available_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+class ControlServer:
+    # Local HTTP API for daemon mode: enqueue jobs, query status and history, stream job results as NDJSON
+    def __init__(self, bot, host, port, token=None):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.token = token
+        self.subscribers = set()
+        self.started_at = time.time()
+        self.runner = None
+
+    async def start(self):
+        app = web.Application(middlewares=[self._auth])
+        app.router.add_post("/jobs", self.enqueue)
+        app.router.add_get("/jobs/{job_id}", self.get_job)
+        app.router.add_get("/status", self.status)
+        app.router.add_get("/history", self.history)
+        app.router.add_get("/events", self.events)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        log.success(f"Control API listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        for queue in list(self.subscribers):
+            queue.put_nowait(None)
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            # A subscriber that stopped reading loses events rather than growing memory
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    @web.middleware
+    async def _auth(self, request, handler):
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return await handler(request)
+
+    async def enqueue(self, request):
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "invalid JSON body"}, status=400)
+        
+        # Every job in the request is validated first; one bad job rejects the whole request
+        specs = body if isinstance(body, list) else [body]
+        prepared = []
+        errors = []
+        for spec in specs:
+            try:
+                if not isinstance(spec, dict):
+                    raise ValueError("job must be an object")
+                unknown = set(spec) - {"kind", "wallet", "params", "priority", "dedupe_key", "max_attempts"}
+                if unknown:
+                    raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+                prepared.append(self.bot.prepare_job(
+                    spec.get("kind"),
+                    spec.get("wallet"),
+                    spec.get("params", {}),
+                    priority=spec.get("priority", 0),
+                    dedupe_key=spec.get("dedupe_key"),
+                    max_attempts=spec.get("max_attempts")
+                ))
+                errors.append(None)
+            except ValueError as e:
+                errors.append(str(e))
+        
+        if not specs or any(errors):
+            response = [{"error": error} if error else {} for error in errors] or {"error": "no jobs"}
+            return web.json_response(response if isinstance(body, list) else response[0], status=400)
+        
+        results = []
+        for job in prepared:
+            job_id, created = self.bot.jobs.enqueue(*job)
+            results.append({"id": job_id, "created": created})
+        return web.json_response(results if isinstance(body, list) else results[0])
+
+    async def get_job(self, request):
+        try:
+            job_id = int(request.match_info["job_id"])
+        except ValueError:
+            return web.json_response({"error": "job id must be an integer"}, status=400)
+        job = self.bot.jobs.get(job_id)
+        if job is None:
+            return web.json_response({"error": "not found"}, status=404)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return web.json_response(job)
+
+    async def status(self, request):
+        provider = self.bot.w3.provider
+        endpoints = []
+        for endpoint in provider.endpoints:
+            health = provider.health[endpoint.endpoint_uri]
+            endpoints.append({
+                "endpoint": endpoint.endpoint_uri,
+                "available": health.available(),
+                "latency": health.latency,
+                "error_rate": health.error_rate(),
+                "concurrency_limit": int(endpoint.limiter.limit) if endpoint.limiter else None,
+                "in_flight": endpoint.limiter.in_flight if endpoint.limiter else None
+            })
+        return web.json_response({
+            "uptime": time.time() - self.started_at,
+            "jobs": self.bot.jobs.counts(),
+            "wallets": len(self.bot.wallets),
+            "inflight_transactions": len(self.bot.inflight),
+            "block": self.bot.receipt_tracker.head,
+            "fees": self.bot.gas_oracle.fees,
+            "rpc": endpoints
+        })
+
+    async def history(self, request):
+        query = request.query
+        try:
+            rows = self.bot.history.query(
+                wallet=Web3.to_checksum_address(query["wallet"]) if "wallet" in query else None,
+                tx_type=query.get("type"),
+                status=query.get("status"),
+                since=float(query["since"]) if "since" in query else None,
+                until=float(query["until"]) if "until" in query else None,
+                before_id=int(query["before_id"]) if "before_id" in query else None,
+                limit=min(int(query.get("limit", 50)), 500)
+            )
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(rows)
+
+    async def events(self, request):
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        queue = asyncio.Queue(maxsize=1000)
+        self.subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    event = {"event": "heartbeat", "time": time.time()}
+                if event is None:
+                    break
+                await response.write(json.dumps(event).encode() + b"\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self.subscribers.discard(queue)
+        return response
+
+class SatsumaBot:
+    def __init__(self, interactive=True):
+        # Non-interactive runs (CLI commands, plans, daemon) never prompt on stdin
+        self.interactive = interactive
+        self.config = self.load_config()
+        self.w3 = self.initialize_provider()
+        self.contracts = ContractRegistry(self.w3, self.config)
+        self.nonce_manager = NonceManager(self.w3)
+        self.gas_oracle = GasOracle(self.w3, self.config)
+        self.receipt_tracker = ReceiptTracker(self.w3, self.config)
+        self.tx_builder = TransactionBuilder(self.config["chain_id"], self.nonce_manager, self.gas_oracle)
+        self.reader = MulticallReader(self.w3, self.config["multicall3"], self.config["multicall_batch_size"])
+        self.allowance_cache = AllowanceCache(self.reader)
+        self.token_registry = TokenRegistry(self.reader, {
+            "USDC": self.config["usdc_address"],
+            "WCBTC": self.config["wcbtc_address"],
+            "SUMA": self.config["suma_address"],
+            "S33": self.config["s33_address"]
+        })
+        self.private_keys = self.get_private_keys()
+        self.wallets = {self.w3.eth.account.from_key(key).address: key for key in self.private_keys}
+        self.settings = self.load_user_settings()
+        self.checkpoint = Checkpoint(CONFIG_FILE, self.settings, self.config["checkpoint_interval"])
+        self.history = TransactionHistory(HISTORY_DB_FILE)
+        self.outbox = Outbox(OUTBOX_DB_FILE)
+        self.outbox_tasks = set()
+        self.jobs = JobQueue(JOBS_DB_FILE, self.config["job_backoff_base"], self.config["job_backoff_max"])
+        self.control_server = None
+        # Signed transactions awaiting their receipt, kept so the watchdog can re-sign the same nonce
+        self.inflight = {}
+
+    def load_config(self):
+        config = {
+            # One or more endpoints, requests go to the healthiest and fail over to the rest
+            "rpc": ["https://rpc.testnet.citrea.xyz"],
+            "rpc_timeout": 30,
+            "http_pool_size": 100,
+            "rpc_batch_window_ms": 10,
+            "rpc_max_batch_size": 100,
+            # Adaptive in-flight request limit per RPC endpoint (AIMD on p95 latency and error rate)
+            "rpc_concurrency_initial": 16,
+            "rpc_concurrency_min": 2,
+            "rpc_concurrency_max": 256,
+            "rpc_latency_target": 1.0,
+            "rpc_error_rate_limit": 0.05,
+            # Consecutive failures before an endpoint is benched for rpc_failure_cooldown seconds
+            "rpc_failure_threshold": 3,
+            "rpc_failure_cooldown": 10,
+            # Re-send slow reads to a second endpoint after max(p95 latency, rpc_hedge_min_delay)
+            "rpc_hedge_reads": True,
+            "rpc_hedge_min_delay": 0.2,
+            "rpc_connect_attempts": 5,
+            # Send each signed transaction to every endpoint concurrently instead of only the healthiest
+            "rpc_broadcast_transactions": False,
+            # "eip1559" derives maxFeePerGas / maxPriorityFeePerGas from eth_feeHistory, "legacy" uses eth_gasPrice
+            "fee_mode": "eip1559",
+            "fee_refresh_interval": 5,
+            "fee_history_blocks": 10,
+            "fee_priority_percentile": 50,
+            "base_fee_multiplier": 2,
+            "block_poll_interval": 1,
+            "confirmations": 1,
+            "receipt_timeout": 300,
+            # A transaction pending this many blocks is re-signed with fee_bump_percent higher fees (0 disables),
+            # at most max_fee_bumps times; once its deadline passes it is cancelled with a zero-value self-transfer,
+            # which is waited on (and bumped) for up to receipt_timeout
+            "stuck_tx_blocks": 3,
+            "fee_bump_percent": 12.5,
+            "max_fee_bumps": 4,
+            # Finalized outbox entries are kept this many seconds for inspection
+            "outbox_retention": 7 * 24 * 60 * 60,
+            "max_concurrent_wallets": 20,
+            # Automated swap scheduling: fleet-wide rate (0 = unlimited), burst size, per-wallet spacing and jitter in seconds
+            "target_tx_per_minute": 60,
+            "rate_burst": 5,
+            "wallet_min_spacing": 5,
+            "schedule_jitter": 10,
+            # Job queue: concurrent workers, attempts before dead-lettering and retry backoff in seconds
+            "job_workers": 20,
+            "job_max_attempts": 3,
+            "job_backoff_base": 5,
+            "job_backoff_max": 300,
+            # Daemon control API, bound to localhost; set SATSUMA_API_TOKEN to require a bearer token
+            "daemon_host": "127.0.0.1",
+            "daemon_port": 8787,
+            # Seconds between write-behind flushes of run progress to satsuma_config.json; resume after a crash is
+            # at-least-once, swaps confirmed within the last interval may run again
+            "checkpoint_interval": 5,
+            "chain_id": 5115,
+            "symbol": "cBTC",
+            "explorer": "https://explorer.testnet.citrea.xyz",
+            "swap_router": Web3.to_checksum_address("0x3012e9049d05b4b5369d690114d5a5861ebb85cb"),
+            "liquidity_router": Web3.to_checksum_address("0x55a4669cd6895EA25C174F13E1b49d69B4481704"),
+            "pool_address": Web3.to_checksum_address("0x080c376e6aB309fF1a861e1c3F91F27b8D4f1443"),
+            "usdc_address": Web3.to_checksum_address("0x2C8abD2A528D19AFc33d2eBA507c0F405c131335"),
+            "wcbtc_address": Web3.to_checksum_address("0x8d0c9d1c17ae5e40fff9be350f57840e9e66cd93"),
+            "suma_address": Web3.to_checksum_address("0xdE4251dd68e1aD5865b14Dd527E54018767Af58a"),
+            "s33_address": Web3.to_checksum_address("0xb93B80d59c2FB3eb23817d4A27841eF8788826f0"),
+            "vesuma_address": Web3.to_checksum_address("0x97a4f684620D578312Dc9fFBc4b0EbD8E804ab4a"),
+            "voting_contract": Web3.to_checksum_address("0x1234567890123456789012345678901234567891"),
+            "staking_contract": Web3.to_checksum_address("0x1234567890123456789012345678901234567892"),
+            "gauge_address": Web3.to_checksum_address("0x1234567890123456789012345678901234567893"),
+            "wrapper_address": Web3.to_checksum_address("0x8d0c9d1c17ae5e40fff9be350f57840e9e66cd93"),
+            # Set to None to disable aggregated reads
+            "multicall3": Web3.to_checksum_address("0xcA11bde05977b3631167028862bE2a173976CA11"),
+            "multicall_batch_size": 500,
+            # "exact" approves the swap amount, "multiple" approves approval_multiplier x amount, "unlimited" approves max uint256
+            "approval_policy": "multiple",
+            "approval_multiplier": 100,
+            # Sign EIP-2612 permits into the swap multicall instead of sending approve transactions
+            "use_permit": True,
+            # Gas limit for a router multicall: base + per swap leg + per selfPermit / unwrap / refund call
+            "swap_base_gas": 150000,
+            "swap_leg_gas": 250000,
+            "extra_call_gas": 80000,
+            # Swap legs packed into each automated transaction
+            "swaps_per_tx": 1
+        }
+        
+        # Values in config.json override the defaults; only keys missing from it are written back
+        user_config = {}
+        try:
+            if os.path.exists(MAIN_CONFIG_FILE):
+                with open(MAIN_CONFIG_FILE, 'r') as f:
+                    user_config = json.load(f)
+        except Exception as e:
+            log.error(f"Could not read {MAIN_CONFIG_FILE}, using defaults: {str(e)}")
+            return config
+        
+        missing = [key for key in config if key not in user_config]
+        for key, value in user_config.items():
+            default = config.get(key)
+            if isinstance(value, str) and isinstance(default, str) and Web3.is_checksum_address(default):
+                value = Web3.to_checksum_address(value)
+            config[key] = value
+        
+        if missing:
+            try:
+                write_json_atomic(MAIN_CONFIG_FILE, {**config, **user_config})
+            except Exception as e:
+                log.warn(f"Could not save config file: {str(e)}")
+        
+        return config
+
+    def initialize_provider(self):
+        rpc = self.config["rpc"]
+        endpoints = [
+            BatchingHTTPProvider(
+                endpoint_uri,
+                chain_id=self.config["chain_id"],
+                batch_window=self.config["rpc_batch_window_ms"] / 1000,
+                max_batch_size=self.config["rpc_max_batch_size"],
+                limiter=AdaptiveLimiter(
+                    self.config["rpc_concurrency_initial"],
+                    self.config["rpc_concurrency_min"],
+                    self.config["rpc_concurrency_max"],
+                    self.config["rpc_latency_target"],
+                    self.config["rpc_error_rate_limit"]
+                ),
+                request_kwargs={"timeout": aiohttp.ClientTimeout(total=self.config["rpc_timeout"])}
+            )
+            for endpoint_uri in ([rpc] if isinstance(rpc, str) else rpc)
+        ]
+        provider = RPCPoolProvider(
+            endpoints,
+            hedge_reads=self.config["rpc_hedge_reads"],
+            hedge_min_delay=self.config["rpc_hedge_min_delay"],
+            failure_threshold=self.config["rpc_failure_threshold"],
+            cooldown=self.config["rpc_failure_cooldown"],
+            broadcast=self.config["rpc_broadcast_transactions"]
+        )
+        return AsyncWeb3(provider)
+
+    async def connect(self):
+        try:
+            # One pooled aiohttp session per endpoint, shared by every coroutine talking to it
+            await self.w3.provider.cache_async_session(
+                self.config["http_pool_size"],
+                aiohttp.ClientTimeout(total=self.config["rpc_timeout"])
+            )
+            
+            # A node that is briefly down is retried, only give up when none answers
+            reachable = []
+            for attempt in range(self.config["rpc_connect_attempts"]):
+                reachable = await self.w3.provider.reachable_endpoints()
+                if reachable:
+                    break
+                log.warn(f"No RPC endpoint reachable, retrying ({attempt + 1}/{self.config['rpc_connect_attempts']})")
+                await asyncio.sleep(2 ** attempt)
+            
+            if not reachable:
+                raise Exception("Failed to connect to any RPC endpoint")
+            
+            for endpoint in self.w3.provider.endpoints:
+                if endpoint.endpoint_uri in reachable:
+                    log.success(f"Connected to {endpoint.endpoint_uri}")
+                else:
+                    log.warn(f"RPC endpoint unreachable, will retry on demand: {endpoint.endpoint_uri}")
+            log.info(f"Chain ID: {self.config['chain_id']}")
+            
+            self.gas_oracle.start()
+            self.receipt_tracker.start()
+            self.checkpoint.start()
+            
+            await self.recover_outbox()
+            
+            recovered = self.jobs.recover()
+            if recovered:
+                log.warn(f"Requeued {recovered} job(s) interrupted by the previous run")
+        except Exception as e:
+            log.error(f"Provider initialization failed: {str(e)}")
+            await self.close()
+            sys.exit(1)
+
+    async def close(self):
+        # Outbox recovery tasks wait on the receipt tracker, stop them first; unfinished rows are picked up next start
+        for task in self.outbox_tasks:
+            task.cancel()
+        await asyncio.gather(*self.outbox_tasks, return_exceptions=True)
+        await self.gas_oracle.stop()
+        await self.receipt_tracker.stop()
+        await self.checkpoint.stop()
+        self.history.close()
+        self.outbox.close()
+        self.jobs.close()
+        try:
+            await self.w3.provider.disconnect()
+        except Exception as e:
+            log.warn(f"Error closing provider: {str(e)}")
+
+    def get_private_keys(self):
+        candidates = []
+        
+        # PRIVATE_KEY_1..N from the environment, in numeric order
+        env_keys = []
+        for name, value in os.environ.items():
+            if name.startswith("PRIVATE_KEY_") and name[len("PRIVATE_KEY_"):].isdigit():
+                env_keys.append((int(name[len("PRIVATE_KEY_"):]), value))
+        candidates.extend(("env", value) for _, value in sorted(env_keys))
+        
+        # wallets.txt and every file under keys/, one key per line
+        key_files = [WALLETS_FILE]
+        if os.path.isdir(KEYS_DIR):
+            key_files.extend(os.path.join(KEYS_DIR, name) for name in sorted(os.listdir(KEYS_DIR)))
+        
+        for path in key_files:
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line and not line.startswith("#"):
+                            candidates.append((path, line))
+            except Exception as e:
+                log.warn(f"Could not read key file {path}: {str(e)}")
+        
+        private_keys = []
+        seen_addresses = set()
+        for source, key in candidates:
+            if key == "your_private_key_here":
+                continue
+            try:
+                account = Web3().eth.account.from_key(key)
+            except Exception as e:
+                log.warn(f"Skipping invalid private key from {source}: {str(e)}")
+                continue
+            if account.address in seen_addresses:
+                continue
+            seen_addresses.add(account.address)
+            private_keys.append(key)
+        
+        if not private_keys:
+            log.error("No valid private key found in environment variables or key files")
+            log.info(f"Please set PRIVATE_KEY_1 in your .env file or add keys to {WALLETS_FILE}")
+            if not self.interactive:
+                sys.exit(1)
+            
+            # For demo purposes, ask for private key input
+            key = input("Enter your private key (without 0x prefix): ")
+            if not key:
+                sys.exit(1)
+            
+            try:
+                account = Web3().eth.account.from_key(key)
+                private_keys.append(key)
+            except Exception as e:
+                log.error(f"Invalid private key: {str(e)}")
+                sys.exit(1)
+        
+        log.success(f"Loaded {len(private_keys)} wallet(s), first address: {Web3().eth.account.from_key(private_keys[0]).address}")
+        return private_keys
+
+    def load_user_settings(self):
+        user_settings = {
+            "transaction_count": 0,
+            "current_round": 0,
+            "total_transactions": 0,
+            "successful_transactions": 0,
+            "failed_transactions": 0,
+            "last_transaction_time": None,
+            # Completed transactions per wallet in the current automated run, cleared when the run finishes
+            "wallet_progress": {}
+        }
+        
+        try:
+            if os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, 'r') as f:
+                    data = json.load(f)
+                    user_settings.update(data)
+                    log.success(f"Loaded configuration: {user_settings['transaction_count']} transactions planned")
+        except Exception as e:
+            log.error(f"Failed to load settings: {str(e)}")
+        
+        return user_settings
+
+    def save_user_settings(self):
+        try:
+            write_json_atomic(CONFIG_FILE, self.settings)
+            self.checkpoint.dirty = False
+            log.success("Configuration saved successfully")
+        except Exception as e:
+            log.error(f"Failed to save settings: {str(e)}")
+
+    def generate_random_amount(self):
+        min_amount = 0.0001
+        max_amount = 0.0002
+        random_amount = random.uniform(min_amount, max_amount)
+        return round(random_amount, 6)
+
+    async def send_transaction(self, account, to, data, tx_params, deadline=None):
+        # deadline: unix time after which a stuck transaction is cancelled instead of fee-bumped
+        tx = await self.tx_builder.build(account.address, to, data, **tx_params)
+        try:
+            tx_hash = await self.broadcast_transaction(account, tx)
+        except Exception:
+            await self.nonce_manager.release(account.address, tx["nonce"])
+            raise
+        self.inflight[bytes(tx_hash)] = {"tx": tx, "deadline": deadline}
+        return tx_hash
+
+    async def broadcast_transaction(self, account, tx):
+        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=account.key)
+        tx_hash = Web3.to_hex(signed_tx.hash)
+        # Durable before it can reach the network, so a crash after broadcast is always recoverable
+        self.outbox.add(tx_hash, account.address, tx["nonce"], Web3.to_hex(signed_tx.raw_transaction), {
+            "to": tx["to"],
+            "call": Calldata.name_of(tx["data"]),
+            "value": tx["value"]
+        })
+        try:
+            return await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception:
+            self.outbox.finalize(tx_hash, "rejected")
+            raise
+
+    def release_inflight(self, tx_hash):
+        # A flow that returns without waiting on its transaction drops the watchdog entry so it does not pile up
+        if tx_hash is not None:
+            self.inflight.pop(bytes(tx_hash), None)
+
+    async def wait_for_receipt(self, account, tx_hash):
+        inflight = self.inflight.pop(bytes(tx_hash), None)
+        try:
+            if inflight is None or not self.config["stuck_tx_blocks"]:
+                receipt = await self.receipt_tracker.wait(tx_hash, self.config["receipt_timeout"])
+            else:
+                receipt = await self.watch_transaction(account, tx_hash, inflight)
+            self.outbox.finalize(Web3.to_hex(receipt["transactionHash"]), "confirmed" if receipt["status"] == 1 else "reverted")
+            return receipt
+        except Exception:
+            # The transaction may have been dropped, resync the nonce from chain
+            self.nonce_manager.reset(account.address)
+            raise
+
+    async def watch_transaction(self, account, tx_hash, inflight):
+        # Waits on every version of this nonce; if none lands within stuck_tx_blocks the fees are bumped.
+        # Once the intent's deadline has passed the nonce is burned with a zero-value self-transfer, and the
+        # wait continues (bumping the cancel if needed) until one version lands or receipt_timeout after the deadline.
+        tx = inflight["tx"]
+        deadline = inflight["deadline"]
+        waits = {asyncio.ensure_future(self.receipt_tracker.wait(tx_hash)): tx_hash}
+        sent_block = self.receipt_tracker.head
+        give_up_at = time.monotonic() + self.config["receipt_timeout"] if deadline is None else None
+        bumps = 0
+        cancel_hashes = set()
+        try:
+            while True:
+                done, _ = await asyncio.wait(waits, timeout=self.config["block_poll_interval"], return_when=asyncio.FIRST_COMPLETED)
+                if done:
+                    landed_task = done.pop()
+                    landed_hash = waits[landed_task]
+                    for other_hash in waits.values():
+                        if other_hash != landed_hash:
+                            self.outbox.finalize(Web3.to_hex(other_hash), "replaced")
+                    if landed_hash in cancel_hashes:
+                        self.outbox.finalize(Web3.to_hex(landed_hash), "cancelled")
+                        raise Exception(f"Transaction cancelled after its deadline passed (nonce {tx['nonce']})")
+                    return landed_task.result()
+                
+                expired = deadline is not None and time.time() > deadline
+                if expired and give_up_at is None:
+                    give_up_at = time.monotonic() + self.config["receipt_timeout"]
+                if give_up_at is not None and time.monotonic() > give_up_at:
+                    raise asyncio.TimeoutError(f"No receipt for nonce {tx['nonce']} after {self.config['receipt_timeout']}s")
+                
+                head = self.receipt_tracker.head
+                if sent_block is None or head is None:
+                    sent_block = head
+                    continue
+                
+                # An expired intent is cancelled right away; otherwise only a transaction stuck for stuck_tx_blocks is bumped
+                cancel = expired and not cancel_hashes
+                if not cancel and (head - sent_block < self.config["stuck_tx_blocks"] or bumps >= self.config["max_fee_bumps"]):
+                    continue
+                
+                replacement = await self.bump_fees(tx)
+                if cancel:
+                    replacement = {**replacement, "to": account.address, "value": 0, "data": b"", "gas": 21000}
+                try:
+                    replacement_hash = await self.broadcast_transaction(account, replacement)
+                except Exception as e:
+                    # Typically the original was mined meanwhile ("nonce too low"), its receipt resolves the wait
+                    log.warn(f"[{account.address[:10]}] Replacement for nonce {tx['nonce']} rejected: {str(e)}")
+                    sent_block = head
+                    continue
+                
+                tx = replacement
+                sent_block = head
+                waits[asyncio.ensure_future(self.receipt_tracker.wait(replacement_hash))] = replacement_hash
+                if cancel:
+                    # The cancel gets its own bump budget
+                    bumps = 0
+                    cancel_hashes.add(replacement_hash)
+                    log.warn(f"[{account.address[:10]}] Nonce {tx['nonce']} still pending past its deadline, cancelling: {replacement_hash.hex()}")
+                else:
+                    bumps += 1
+                    if cancel_hashes:
+                        cancel_hashes.add(replacement_hash)
+                    log.warn(f"[{account.address[:10]}] Nonce {tx['nonce']} stuck, fee bump {bumps}/{self.config['max_fee_bumps']}: {replacement_hash.hex()}")
+        finally:
+            for task in waits:
+                task.cancel()
+
+    async def bump_fees(self, tx):
+        # Bumped by fee_bump_percent over the previous version, or to the current market fee if that is higher
+        fees = await self.gas_oracle.get_fees()
+        factor = 1 + self.config["fee_bump_percent"] / 100
+        if "gasPrice" in tx:
+            return {**tx, "gasPrice": max(int(tx["gasPrice"] * factor), fees.get("gasPrice", 0))}
+        
+        priority_fee = max(int(tx["maxPriorityFeePerGas"] * factor), fees.get("maxPriorityFeePerGas", 0))
+        max_fee = max(int(tx["maxFeePerGas"] * factor), fees.get("maxFeePerGas", 0), priority_fee)
+        return {**tx, "maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee}
+
+    async def recover_outbox(self):
+        # Reconcile transactions left in flight by a previous run against chain state
+        self.outbox.prune(self.config["outbox_retention"])
+        entries = self.outbox.pending()
+        if not entries:
+            return
+        
+        log.info(f"Reconciling {len(entries)} in-flight transaction(s) from the previous run")
+        wallets = sorted({entry["wallet"] for entry in entries})
+        receipts, mined_nonces = await asyncio.gather(
+            asyncio.gather(*[self.w3.eth.get_transaction_receipt(entry["tx_hash"]) for entry in entries], return_exceptions=True),
+            asyncio.gather(*[self.w3.eth.get_transaction_count(wallet, "latest") for wallet in wallets])
+        )
+        mined_nonces = dict(zip(wallets, mined_nonces))
+        
+        unresolved = []
+        for entry, receipt in zip(entries, receipts):
+            if not isinstance(receipt, Exception) and receipt is not None:
+                self.outbox.finalize(entry["tx_hash"], "confirmed" if receipt["status"] == 1 else "reverted")
+            elif entry["nonce"] < mined_nonces[entry["wallet"]]:
+                # The nonce was consumed by a different transaction
+                self.outbox.finalize(entry["tx_hash"], "replaced")
+            else:
+                unresolved.append(entry)
+        
+        by_wallet = {}
+        for entry in unresolved:
+            by_wallet.setdefault(entry["wallet"], []).append(entry)
+        rebroadcast = await asyncio.gather(*[self.rebroadcast_wallet(wallet_entries) for wallet_entries in by_wallet.values()])
+        
+        log.success(f"Outbox reconciled: {len(entries) - len(unresolved)} finalized, {sum(rebroadcast)} rebroadcast")
+
+    async def rebroadcast_wallet(self, entries):
+        # In nonce order so the node never sees a gap
+        count = 0
+        for entry in entries:
+            try:
+                tx_hash = await self.w3.eth.send_raw_transaction(entry["raw"])
+            except Exception as e:
+                log.warn(f"Dropping outbox transaction {entry['tx_hash']} (nonce {entry['nonce']}): {str(e)}")
+                self.outbox.finalize(entry["tx_hash"], "dropped")
+                continue
+            
+            count += 1
+            task = asyncio.ensure_future(self.finalize_outbox_entry(tx_hash))
+            self.outbox_tasks.add(task)
+            task.add_done_callback(self.outbox_tasks.discard)
+        return count
+
+    async def finalize_outbox_entry(self, tx_hash):
+        try:
+            receipt = await self.receipt_tracker.wait(tx_hash, self.config["receipt_timeout"])
+            self.outbox.finalize(Web3.to_hex(tx_hash), "confirmed" if receipt["status"] == 1 else "reverted")
+        except Exception as e:
+            # Stays pending and is reconciled again on the next start
+            log.warn(f"Rebroadcast transaction {tx_hash.hex()} not confirmed: {str(e)}")
+
+    def record_transaction(self, tx_type, account, started, tx_hash=None, receipt=None, error=None, tokens=None, amounts=None):
+        if receipt is not None:
+            status = "success" if receipt["status"] == 1 else "failed"
+        else:
+            status = "error"
+        try:
+            self.history.record(
+                tx_type,
+                account.address,
+                status,
+                tx_hash=tx_hash.hex() if tx_hash else None,
+                tokens=tokens,
+                amounts=amounts,
+                gas_used=receipt["gasUsed"] if receipt is not None else None,
+                block_number=receipt["blockNumber"] if receipt is not None else None,
+                latency=time.monotonic() - started,
+                error=error
+            )
+        except Exception as e:
+            log.warn(f"Could not record transaction: {str(e)}")
+
+    def approval_amount(self, amount):
+        policy = self.config["approval_policy"]
+        if policy == "unlimited":
+            return MAX_UINT256
+        if policy == "multiple":
+            return min(amount * self.config["approval_multiplier"], MAX_UINT256)
+        return amount
+
+    async def approve_token(self, account, token_address, spender_address, amount):
+        allowance_key = (account.address, token_address, spender_address)
+        started = time.monotonic()
+        try:
+            allowance = await self.allowance_cache.get(*allowance_key)
+            if allowance is not None and allowance >= amount:
+                return {"success": True, "tx_hash": None, "allowance_key": allowance_key}
+            
+            log.processing("Sending approval transaction...")
+            
+            # Not awaited here: the dependent transaction is sent right behind it with the next nonce
+            approve_amount = self.approval_amount(amount)
+            tx_hash = await self.send_transaction(account, token_address, Calldata.APPROVE.encode(spender_address, approve_amount), {"gas": 100000})
+            self.allowance_cache.set(*allowance_key, approve_amount)
+            return {"success": True, "tx_hash": tx_hash, "allowance_key": allowance_key, "started": started}
+                
+        except Exception as e:
+            log.error(f"Approval error: {str(e)}")
+            self.record_transaction("approval", account, started, error=str(e), tokens=[token_address, spender_address])
+            self.allowance_cache.invalidate(*allowance_key)
+            return {"success": False, "tx_hash": None, "allowance_key": allowance_key}
+
+    async def build_permit_call(self, account, token_address, amount, deadline):
+        # Returns a router selfPermitIfNecessary call replacing the approve transaction, or None if the token has no EIP-2612 permit
+        if not self.config["use_permit"]:
+            return None
+        
+        domain = await self.token_registry.get_permit_domain(token_address, self.config["chain_id"])
+        if not domain:
+            return None
+        
+        nonce = await self.reader.get_permit_nonce(token_address, account.address)
+        if nonce is None:
+            return None
+        
+        value = self.approval_amount(amount)
+        signed = self.w3.eth.account.sign_typed_data(
+            account.key,
+            domain_data=domain,
+            message_types={
+                "Permit": [
+                    {"name": "owner", "type": "address"},
+                    {"name": "spender", "type": "address"},
+                    {"name": "value", "type": "uint256"},
+                    {"name": "nonce", "type": "uint256"},
+                    {"name": "deadline", "type": "uint256"}
+                ]
+            },
+            message_data={
+                "owner": account.address,
+                "spender": self.config["swap_router"],
+                "value": value,
+                "nonce": nonce,
+                "deadline": deadline
+            }
+        )
+        
+        return Calldata.SELF_PERMIT_IF_NECESSARY.encode(
+            token_address, value, deadline, signed.v,
+            signed.r.to_bytes(32, "big"), signed.s.to_bytes(32, "big")
+        )
+
+    async def approve_for_router(self, account, token_address, amount, deadline):
+        # Permit-capable tokens get a selfPermitIfNecessary prepended to the router multicall instead of an approve transaction
+        allowance_key = (account.address, token_address, self.config["swap_router"])
+        allowance = await self.allowance_cache.get(*allowance_key)
+        if allowance is not None and allowance >= amount:
+            return {"success": True, "tx_hash": None, "allowance_key": allowance_key}, []
+        
+        try:
+            permit_call = await self.build_permit_call(account, token_address, amount, deadline)
+        except Exception as e:
+            log.warn(f"Permit signing failed, falling back to approve: {str(e)}")
+            permit_call = None
+        
+        if permit_call:
+            # The permitted value is cached by the caller once the multicall carrying it has been broadcast
+            return {"success": True, "tx_hash": None, "allowance_key": allowance_key, "permit_value": self.approval_amount(amount)}, [permit_call]
+        
+        return await self.approve_token(account, token_address, self.config["swap_router"], amount), []
+
+    async def confirm_approval(self, account, approval_result):
+        if not approval_result["tx_hash"]:
+            return True
+        
+        tx_hash = approval_result["tx_hash"]
+        receipt = await self.wait_for_receipt(account, tx_hash)
+        tx_hash = receipt["transactionHash"]
+        self.record_transaction("approval", account, approval_result["started"], tx_hash, receipt, tokens=list(approval_result["allowance_key"][1:]))
+        
+        if receipt["status"] == 1:
+            log.success(f"Approval successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
+            return True
+        
+        log.error("Approval transaction failed")
+        self.allowance_cache.invalidate(*approval_result["allowance_key"])
+        return False
+
+    async def confirm_approvals(self, account, approval_results):
+        # Waits for and records every broadcast approval, even after one of them fails, and empties the list
+        confirmed = True
+        while approval_results:
+            approval_result = approval_results.pop(0)
+            try:
+                confirmed = await self.confirm_approval(account, approval_result) and confirmed
+            except Exception as e:
+                log.error(f"Approval error: {str(e)}")
+                self.record_transaction("approval", account, approval_result["started"], approval_result["tx_hash"], error=str(e), tokens=list(approval_result["allowance_key"][1:]))
+                self.allowance_cache.invalidate(*approval_result["allowance_key"])
+                confirmed = False
+        return confirmed
+
+    def settle_allowance(self, approval_result, amount, success):
+        if success:
+            self.allowance_cache.spend(*approval_result["allowance_key"], amount)
+        else:
+            # A reverted spend leaves the on-chain allowance unknown, re-read it next time
+            self.allowance_cache.invalidate(*approval_result["allowance_key"])
+
+    async def get_token_balance(self, token_address, account_address):
+        try:
+            token_contract = self.contracts.erc20(token_address)
+            balance, metadata = await asyncio.gather(
+                token_contract.functions.balanceOf(account_address).call(),
+                self.token_registry.get(token_address)
+            )
+            
+            return {
+                "balance": balance,
+                "decimals": metadata["decimals"],
+                "symbol": metadata["symbol"],
+                "formatted": balance / (10 ** metadata["decimals"])
+            }
+        except Exception as e:
+            log.error(f"Error getting token balance: {str(e)}")
+            return None
+
+    def swap_gas_limit(self, leg_count, extra_call_count):
+        return self.config["swap_base_gas"] + self.config["swap_leg_gas"] * leg_count + self.config["extra_call_gas"] * extra_call_count
+
+    async def perform_swap(self, private_key, token_in, token_out, amount_in):
+        return await self.perform_batch_swap(private_key, [(token_in, token_out, amount_in)])
+
+    async def perform_batch_swap(self, private_key, legs):
+        # legs: list of (token_in, token_out, amount_in), all packed into one router multicall.
+        # NATIVE_TOKEN as token_in pays with msg.value, as token_out unwraps WCBTC to the wallet in the same multicall.
+        account = self.w3.eth.account.from_key(private_key)
+        tx_type = "multicall_swap" if len(legs) == 1 else "multicall_batch_swap"
+        started = time.monotonic()
+        tx_hash = None
+        unconfirmed = []
+        try:
+            if len(legs) == 1:
+                log.info(f"Performing swap for {account.address}")
+            else:
+                log.info(f"Performing {len(legs)} batched swaps for {account.address}")
+            
+            wcbtc = self.config["wcbtc_address"]
+            token_infos = await self.token_registry.get_many([wcbtc if token_in == NATIVE_TOKEN else token_in for token_in, _, _ in legs])
+            if not all(token_infos.values()):
+                return {"success": False, "error": "Could not get token in info"}
+            
+            deadline = int(time.time()) + 300  # 5 minutes
+            
+            encoded_swap_calls = []
+            amounts_by_token = {}
+            native_value = 0
+            unwrap_native = False
+            for token_in, token_out, amount_in in legs:
+                recipient = account.address
+                
+                if token_in == NATIVE_TOKEN:
+                    amount_in_wei = self.w3.to_wei(amount_in, 'ether')
+                    native_value += amount_in_wei
+                    token_in = wcbtc
+                else:
+                    amount_in_wei = int(amount_in * (10 ** token_infos[Web3.to_checksum_address(token_in)]['decimals']))
+                    amounts_by_token[token_in] = amounts_by_token.get(token_in, 0) + amount_in_wei
+                
+                if token_out == NATIVE_TOKEN:
+                    # The router keeps the WCBTC and unwraps it to the wallet at the end of the multicall
+                    token_out = wcbtc
+                    recipient = self.config["swap_router"]
+                    unwrap_native = True
+                
+                # Use a tuple for parameters to match the ABI structure
+                swap_params = (
+                    token_in,
+                    token_out,
+                    self.w3.to_checksum_address("0x0000000000000000000000000000000000000000"), #deployer can be a zero address if not used
+                    recipient,
+                    deadline,
+                    amount_in_wei,
+                    0,
+                    0
+                )
+                
+                # Encode the `exactInputSingle` call with the precompiled encoder
+                encoded_swap_calls.append(Calldata.EXACT_INPUT_SINGLE.encode(swap_params))
+            
+            # Approve each input token once for the whole batch, or sign permits that ride along in the multicall
+            await self.allowance_cache.get_many([(account.address, token, self.config["swap_router"]) for token in amounts_by_token])
+            approvals = []
+            permit_calls = []
+            for token_in, total_amount in amounts_by_token.items():
+                approval_result, token_permit_calls = await self.approve_for_router(account, token_in, total_amount, deadline)
+                if not approval_result["success"]:
+                    await self.confirm_approvals(account, unconfirmed)
+                    return {"success": False, "error": "Approval failed"}
+                approvals.append((approval_result, total_amount))
+                unconfirmed.append(approval_result)
+                permit_calls.extend(token_permit_calls)
+            
+            native_calls = []
+            if unwrap_native:
+                native_calls.append(Calldata.UNWRAP_WNATIVE_TOKEN.encode(0, account.address))
+            if native_value:
+                # Return any cBTC the router did not spend
+                native_calls.append(Calldata.REFUND_NATIVE_TOKEN.encode())
+            
+            # Build the `multicall` transaction with the encoded swap calls
+            tx_hash = await self.send_transaction(
+                account,
+                self.config["swap_router"],
+                Calldata.MULTICALL.encode(permit_calls + encoded_swap_calls + native_calls),
+                {"value": native_value, "gas": self.swap_gas_limit(len(encoded_swap_calls), len(permit_calls) + len(native_calls))},
+                deadline=deadline
+            )
+            for approval_result, _ in approvals:
+                if "permit_value" in approval_result:
+                    self.allowance_cache.set(*approval_result["allowance_key"], approval_result["permit_value"])
+            
+            # The swap is already out, so it is awaited and recorded even when an approval failed
+            approvals_confirmed = await self.confirm_approvals(account, unconfirmed)
+            
+            log.processing("Waiting for swap confirmation...")
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.record_transaction(tx_type, account, started, tx_hash, receipt, tokens=[[token_in, token_out] for token_in, token_out, _ in legs], amounts=[amount_in for _, _, amount_in in legs])
+            for approval_result, total_amount in approvals:
+                self.settle_allowance(approval_result, total_amount, receipt["status"] == 1)
+            
+            if receipt["status"] == 1:
+                log.success(f"Swap successful via multicall! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
+                return {"success": True, "tx_hash": tx_hash.hex()}
+            else:
+                log.error("Multicall swap transaction failed")
+                return {"success": False, "error": "Transaction failed" if approvals_confirmed else "Approval failed"}
+                
+        except Exception as e:
+            log.error(f"Multicall swap error: {str(e)}")
+            self.record_transaction(tx_type, account, started, tx_hash, error=str(e), tokens=[[token_in, token_out] for token_in, token_out, _ in legs], amounts=[amount_in for _, _, amount_in in legs])
+            await self.confirm_approvals(account, unconfirmed)
+            return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
+
+    async def add_liquidity(self, private_key, token_a, token_b, amount_a, amount_b):
+        account = self.w3.eth.account.from_key(private_key)
+        started = time.monotonic()
+        tx_hash = None
+        unconfirmed = []
+        try:
+            log.info(f"Adding liquidity for {account.address}")
+            
+            amount_a_wei = int(amount_a * 10**18)
+            amount_b_wei = int(amount_b * 10**18)
+            
+            # Read both allowances in one call, then approve both tokens
+            await self.allowance_cache.get_many([
+                (account.address, token_a, self.config["liquidity_router"]),
+                (account.address, token_b, self.config["liquidity_router"])
+            ])
+            
+            approval_a = await self.approve_token(account, token_a, self.config["liquidity_router"], amount_a_wei)
+            if not approval_a["success"]:
+                return {"success": False, "error": "Token A approval failed"}
+            unconfirmed.append(approval_a)
+            
+            approval_b = await self.approve_token(account, token_b, self.config["liquidity_router"], amount_b_wei)
+            if not approval_b["success"]:
+                await self.confirm_approvals(account, unconfirmed)
+                return {"success": False, "error": "Token B approval failed"}
+            unconfirmed.append(approval_b)
+            
+            # Add liquidity
+            deadline = int(time.time()) + 300
+            
+            tx_hash = await self.send_transaction(account, self.config["liquidity_router"], Calldata.ADD_LIQUIDITY.encode(
+                token_a, token_b, account.address, account.address,
+                amount_a_wei, amount_b_wei, 0, 0, deadline
+            ), {"gas": 400000}, deadline=deadline)
+            
+            # The add is already out, so it is awaited and recorded even when an approval failed
+            approvals_confirmed = await self.confirm_approvals(account, unconfirmed)
+            
+            log.processing("Waiting for liquidity confirmation...")
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.settle_allowance(approval_a, amount_a_wei, receipt["status"] == 1)
+            self.settle_allowance(approval_b, amount_b_wei, receipt["status"] == 1)
+            self.record_transaction("liquidity", account, started, tx_hash, receipt, tokens=[token_a, token_b], amounts=[amount_a, amount_b])
+            
+            if receipt["status"] == 1:
+                log.success(f"Liquidity added successfully! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
+                return {"success": True, "tx_hash": tx_hash.hex()}
+            else:
+                log.error("Liquidity transaction failed")
+                return {"success": False, "error": "Transaction failed" if approvals_confirmed else "Approval failed"}
+                
+        except Exception as e:
+            log.error(f"Liquidity error: {str(e)}")
+            self.record_transaction("liquidity", account, started, tx_hash, error=str(e), tokens=[token_a, token_b], amounts=[amount_a, amount_b])
+            await self.confirm_approvals(account, unconfirmed)
+            return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
+
+    async def convert_to_vesuma(self, private_key, amount, lock_time_days):
+        account = self.w3.eth.account.from_key(private_key)
+        started = time.monotonic()
+        tx_hash = None
+        unconfirmed = []
+        try:
+            log.info(f"Converting SUMA to veSUMA for {account.address}")
+            
             amount_wei = int(amount * 10**18)
             unlock_time = int(time.time()) + (lock_time_days * 24 * 60 * 60)
             
@@ -1135,76 +3243,54 @@ class SatsumaBot:
             approval_result = await self.approve_token(account, self.config["suma_address"], self.config["vesuma_address"], amount_wei)
             if not approval_result["success"]:
                 return {"success": False, "error": "SUMA approval failed"}
+            unconfirmed.append(approval_result)
             
             # Create lock
-            vesuma_contract = self.w3.eth.contract(address=self.config["vesuma_address"], abi=VESUMA_ABI)
-            
-            nonce = self.w3.eth.get_transaction_count(account.address)
+            tx_hash = await self.send_transaction(account, self.config["vesuma_address"], Calldata.CREATE_LOCK.encode(amount_wei, unlock_time), {"gas": 200000})
             
-            lock_tx = vesuma_contract.functions.create_lock(amount_wei, unlock_time).build_transaction({
-                "from": account.address,
-                "gas": 200000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(lock_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            # The lock is already out, so it is awaited and recorded even when the approval failed
+            approval_confirmed = await self.confirm_approvals(account, unconfirmed)
             
             log.processing("Waiting for veSUMA conversion confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.settle_allowance(approval_result, amount_wei, receipt["status"] == 1)
+            self.record_transaction("vesuma_conversion", account, started, tx_hash, receipt, tokens=[self.config["suma_address"]], amounts=[amount])
             
             if receipt["status"] == 1:
                 log.success(f"veSUMA conversion successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "vesuma_conversion",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
                 return {"success": True, "tx_hash": tx_hash.hex()}
             else:
                 log.error("veSUMA conversion failed")
-                return {"success": False, "error": "Transaction failed"}
+                return {"success": False, "error": "Transaction failed" if approval_confirmed else "SUMA approval failed"}
                 
         except Exception as e:
             log.error(f"veSUMA conversion error: {str(e)}")
+            self.record_transaction("vesuma_conversion", account, started, tx_hash, error=str(e), tokens=[self.config["suma_address"]], amounts=[amount])
+            await self.confirm_approvals(account, unconfirmed)
             return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
 
     async def stake_vesuma(self, private_key, amount):
+        account = self.w3.eth.account.from_key(private_key)
+        started = time.monotonic()
+        tx_hash = None
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
             log.info(f"Staking veSUMA for {account.address}")
             
             amount_wei = int(amount * 10**18)
             
             # Stake veSUMA
-            staking_contract = self.w3.eth.contract(address=self.config["staking_contract"], abi=STAKING_ABI)
-            
-            nonce = self.w3.eth.get_transaction_count(account.address)
-            
-            stake_tx = staking_contract.functions.stake(amount_wei).build_transaction({
-                "from": account.address,
-                "gas": 200000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(stake_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_hash = await self.send_transaction(account, self.config["staking_contract"], Calldata.STAKE.encode(amount_wei), {"gas": 200000})
             
             log.processing("Waiting for staking confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.record_transaction("staking", account, started, tx_hash, receipt, tokens=[self.config["vesuma_address"]], amounts=[amount])
             
             if receipt["status"] == 1:
                 log.success(f"veSUMA staking successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "staking",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
                 return {"success": True, "tx_hash": tx_hash.hex()}
             else:
                 log.error("Staking transaction failed")
@@ -1212,40 +3298,28 @@ class SatsumaBot:
                 
         except Exception as e:
             log.error(f"Staking error: {str(e)}")
+            self.record_transaction("staking", account, started, tx_hash, error=str(e), tokens=[self.config["vesuma_address"]], amounts=[amount])
             return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
 
     async def vote_with_vesuma(self, private_key, gauge_address, weight):
+        account = self.w3.eth.account.from_key(private_key)
+        started = time.monotonic()
+        tx_hash = None
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
             log.info(f"Voting with veSUMA for {account.address}")
             
             # Vote with veSUMA
-            voting_contract = self.w3.eth.contract(address=self.config["voting_contract"], abi=VOTING_ABI)
-            
-            nonce = self.w3.eth.get_transaction_count(account.address)
-            
-            vote_tx = voting_contract.functions.vote(gauge_address, weight).build_transaction({
-                "from": account.address,
-                "gas": 200000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(vote_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_hash = await self.send_transaction(account, self.config["voting_contract"], Calldata.VOTE.encode(gauge_address, weight), {"gas": 200000})
             
             log.processing("Waiting for voting confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.record_transaction("voting", account, started, tx_hash, receipt, tokens=[gauge_address], amounts=[weight])
             
             if receipt["status"] == 1:
                 log.success(f"Voting successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "voting",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
                 return {"success": True, "tx_hash": tx_hash.hex()}
             else:
                 log.error("Voting transaction failed")
@@ -1253,42 +3327,29 @@ class SatsumaBot:
                 
         except Exception as e:
             log.error(f"Voting error: {str(e)}")
+            self.record_transaction("voting", account, started, tx_hash, error=str(e), tokens=[gauge_address], amounts=[weight])
             return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
 
     async def perform_wrap(self, private_key, amount):
+        account = self.w3.eth.account.from_key(private_key)
+        started = time.monotonic()
+        tx_hash = None
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
             log.info(f"Wrapping cBTC to WCBTC for {account.address}")
             
             amount_wei = self.w3.to_wei(amount, 'ether')
             
-            wrapper_contract = self.w3.eth.contract(address=self.config["wrapper_address"], abi=WRAPPER_ABI)
-            
-            nonce = self.w3.eth.get_transaction_count(account.address)
-            
-            wrap_tx = wrapper_contract.functions.deposit().build_transaction({
-                "from": account.address,
-                "value": amount_wei,
-                "gas": 150000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(wrap_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_hash = await self.send_transaction(account, self.config["wrapper_address"], Calldata.DEPOSIT.encode(), {"value": amount_wei, "gas": 150000})
             
             log.processing("Waiting for wrap confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.record_transaction("wrap", account, started, tx_hash, receipt, tokens=[NATIVE_TOKEN, self.config["wcbtc_address"]], amounts=[amount])
             
             if receipt["status"] == 1:
                 log.success(f"Wrap successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "wrap",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
                 return {"success": True, "tx_hash": tx_hash.hex()}
             else:
                 log.error("Wrap transaction failed")
@@ -1296,47 +3357,32 @@ class SatsumaBot:
                 
         except Exception as e:
             log.error(f"Wrap error: {str(e)}")
+            self.record_transaction("wrap", account, started, tx_hash, error=str(e), tokens=[NATIVE_TOKEN, self.config["wcbtc_address"]], amounts=[amount])
             return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
 
     async def perform_unwrap(self, private_key, amount):
+        account = self.w3.eth.account.from_key(private_key)
+        started = time.monotonic()
+        tx_hash = None
         try:
-            account = self.w3.eth.account.from_key(private_key)
-            
             log.info(f"Unwrapping WCBTC to cBTC for {account.address}")
             
-            wrapper_contract = self.w3.eth.contract(address=self.config["wrapper_address"], abi=WRAPPER_ABI)
-            token_in_info = await self.get_token_balance(self.config["wcbtc_address"], account.address)
+            token_in_info = await self.token_registry.get(self.config["wcbtc_address"])
             
             amount_wei = int(amount * (10 ** token_in_info['decimals']))
             
-            # Approve WCBTC first
-            approval_result = await self.approve_token(account, self.config["wcbtc_address"], self.config["wrapper_address"], amount_wei)
-            if not approval_result["success"]:
-                return {"success": False, "error": "Approval failed"}
-
-            nonce = approval_result["nonce"]
-            
-            unwrap_tx = wrapper_contract.functions.withdraw(amount_wei).build_transaction({
-                "from": account.address,
-                "gas": 150000,
-                "gasPrice": self.w3.eth.gas_price,
-                "nonce": nonce
-            })
-            
-            signed_tx = self.w3.eth.account.sign_transaction(unwrap_tx, private_key=private_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            # withdraw burns the caller's own WCBTC, no approval needed
+            tx_hash = await self.send_transaction(account, self.config["wrapper_address"], Calldata.WITHDRAW.encode(amount_wei), {"gas": 150000})
             
             log.processing("Waiting for unwrap confirmation...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = await self.wait_for_receipt(account, tx_hash)
+            tx_hash = receipt["transactionHash"]
+            self.record_transaction("unwrap", account, started, tx_hash, receipt, tokens=[self.config["wcbtc_address"], NATIVE_TOKEN], amounts=[amount])
             
             if receipt["status"] == 1:
                 log.success(f"Unwrap successful! Tx: {self.config['explorer']}/tx/{tx_hash.hex()}")
-                self.transaction_history.append({
-                    "type": "unwrap",
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success"
-                })
                 return {"success": True, "tx_hash": tx_hash.hex()}
             else:
                 log.error("Unwrap transaction failed")
@@ -1344,60 +3390,441 @@ class SatsumaBot:
                 
         except Exception as e:
             log.error(f"Unwrap error: {str(e)}")
+            self.record_transaction("unwrap", account, started, tx_hash, error=str(e), tokens=[self.config["wcbtc_address"], NATIVE_TOKEN], amounts=[amount])
             return {"success": False, "error": str(e)}
+        finally:
+            self.release_inflight(tx_hash)
 
     async def start_automated_swaps(self):
         if self.settings["transaction_count"] == 0:
             log.error("No transactions configured. Please set transaction count first.")
             return
         
-        log.info(f"Starting automated swaps with {self.settings['transaction_count']} transactions")
+        count = self.settings["transaction_count"]
+        addresses = [self.w3.eth.account.from_key(private_key).address for private_key in self.private_keys]
+        progress = self.settings["wallet_progress"]
+        
+        # An interrupted run picks up each wallet at the transaction after its last completed one; wallets that
+        # already finished are skipped and wallets that never started begin from the first transaction
+        completed = [progress.get(address, 0) for address in addresses]
+        if any(completed) and not all(value >= count for value in completed):
+            log.info(f"Resuming interrupted run at round {self.settings['current_round'] + 1}/{count}")
+        else:
+            progress.clear()
+            self.settings["current_round"] = 0
+        for address in addresses:
+            progress.setdefault(address, 0)
+        
+        log.info(f"Starting automated swaps: {count} transactions per wallet across {len(self.private_keys)} wallet(s)")
+        if self.config["target_tx_per_minute"]:
+            log.info(f"Target rate: {self.config['target_tx_per_minute']} transactions per minute")
+        
+        # Caps how many swap flows are in flight at once across the whole fleet
+        semaphore = asyncio.Semaphore(self.config["max_concurrent_wallets"])
+        # Global pacing: whichever wallet is ready takes the next slot
+        rate_limiter = TokenBucket(self.config["target_tx_per_minute"], self.config["rate_burst"])
         
+        await asyncio.gather(*[
+            self.run_wallet_swaps(private_key, count, semaphore, rate_limiter)
+            for private_key in self.private_keys
+        ])
+        
+        if all(progress.get(address, 0) >= count for address in addresses):
+            progress.clear()
+            self.settings["current_round"] = 0
+        self.checkpoint.mark_dirty()
+        self.checkpoint.flush()
+        
+        log.success("Automated swaps completed!")
+        log.info(f"Total: {self.settings['total_transactions']}, Success: {self.settings['successful_transactions']}, Failed: {self.settings['failed_transactions']}")
+
+    async def run_wallet_swaps(self, private_key, count, semaphore, rate_limiter):
         tokens = [self.config["usdc_address"], self.config["wcbtc_address"], self.config["suma_address"], self.config["s33_address"]]
+        address = self.w3.eth.account.from_key(private_key).address
+        next_start = 0
         
-        for i in range(self.settings["transaction_count"]):
+        for i in range(self.settings["wallet_progress"].get(address, 0), count):
             try:
-                # Random token pair
-                token_in = random.choice(tokens)
-                token_out = random.choice([t for t in tokens if t != token_in])
-                
-                # Random amount
-                amount = self.generate_random_amount()
+                # Per-wallet spacing is measured from the previous start, so slow or failed swaps do not add to it
+                wait = next_start - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await rate_limiter.acquire()
+                next_start = time.monotonic() + self.config["wallet_min_spacing"] + random.uniform(0, self.config["schedule_jitter"])
                 
-                # Random private key
-                private_key = random.choice(self.private_keys)
-                
-                log.info(f"Transaction {i+1}/{self.settings['transaction_count']}")
+                legs = []
+                for _ in range(self.config["swaps_per_tx"]):
+                    # Random token pair
+                    token_in = random.choice(tokens)
+                    token_out = random.choice([t for t in tokens if t != token_in])
+                    
+                    # Random amount
+                    legs.append((token_in, token_out, self.generate_random_amount()))
                 
-                result = await self.perform_swap(private_key, token_in, token_out, amount)
+                async with semaphore:
+                    log.info(f"[{address[:10]}] Transaction {i+1}/{count}")
+                    result = await self.perform_batch_swap(private_key, legs)
                 
                 if result["success"]:
                     self.settings["successful_transactions"] += 1
-                    log.success(f"Swap {i+1} completed successfully")
+                    log.success(f"[{address[:10]}] Swap {i+1} completed successfully")
                 else:
                     self.settings["failed_transactions"] += 1
-                    log.error(f"Swap {i+1} failed: {result.get('error', 'Unknown error')}")
+                    log.error(f"[{address[:10]}] Swap {i+1} failed: {result.get('error', 'Unknown error')}")
                 
                 self.settings["total_transactions"] += 1
                 self.settings["last_transaction_time"] = datetime.now().isoformat()
                 
-                # Save progress
-                self.save_user_settings()
-                
-                # Random delay between transactions
-                delay = random.uniform(5, 15)
-                log.info(f"Waiting {delay:.1f} seconds before next transaction...")
-                await asyncio.sleep(delay)
-                
             except Exception as e:
-                log.error(f"Error in transaction {i+1}: {str(e)}")
+                log.error(f"[{address[:10]}] Error in transaction {i+1}: {str(e)}")
                 self.settings["failed_transactions"] += 1
                 self.settings["total_transactions"] += 1
-                self.save_user_settings()
+            
+            # Progress is flushed by the checkpoint task, not on every transaction
+            progress = self.settings["wallet_progress"]
+            progress[address] = i + 1
+            self.settings["current_round"] = min(progress.values())
+            self.checkpoint.mark_dirty()
+        
+        # A finished wallet is written out right away so a crash later in the run does not repeat its swaps
+        self.checkpoint.flush()
+
+    def prepare_job(self, kind, wallet, params, priority=0, dedupe_key=None, max_attempts=None):
+        # Validates and normalizes a job before it is stored; raises ValueError describing the first problem
+        if kind not in JobQueue.KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if not isinstance(wallet, str) or not Web3.is_address(wallet):
+            raise ValueError(f"Invalid wallet address: {wallet}")
+        wallet = Web3.to_checksum_address(wallet)
+        if wallet not in self.wallets:
+            raise ValueError(f"Unknown wallet: {wallet}")
+        if not isinstance(params, dict):
+            raise ValueError("params must be an object")
+        if isinstance(priority, bool) or not isinstance(priority, (int, str)):
+            raise ValueError("priority must be an integer")
+        try:
+            priority = int(priority)
+        except ValueError:
+            raise ValueError("priority must be an integer")
+        if dedupe_key is not None and not isinstance(dedupe_key, str):
+            raise ValueError("dedupe_key must be a string")
+        if max_attempts is None:
+            max_attempts = self.config["job_max_attempts"]
+        if isinstance(max_attempts, bool) or not isinstance(max_attempts, int) or max_attempts < 1:
+            raise ValueError("max_attempts must be a positive integer")
+        return kind, wallet, self.normalize_job_params(kind, params), priority, dedupe_key, max_attempts
+
+    def normalize_job_params(self, kind, params):
+        def amount(name, source=params):
+            try:
+                value = float(source[name])
+            except KeyError:
+                raise ValueError(f"{kind}: missing {name}")
+            except (TypeError, ValueError):
+                raise ValueError(f"{kind}: {name} must be a number")
+            if not value > 0:
+                raise ValueError(f"{kind}: {name} must be positive")
+            return value
+        
+        def integer(name, minimum):
+            value = params.get(name)
+            if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+                raise ValueError(f"{kind}: {name} must be an integer")
+            if int(value) < minimum:
+                raise ValueError(f"{kind}: {name} must be at least {minimum}")
+            return int(value)
+        
+        def token(value, name):
+            resolved = self.parse_token_input(value) if isinstance(value, str) else None
+            if resolved != NATIVE_TOKEN and (resolved is None or not Web3.is_address(resolved)):
+                raise ValueError(f"{kind}: {name} must be a token address, symbol or {self.config['symbol']}")
+            return resolved if resolved == NATIVE_TOKEN else Web3.to_checksum_address(resolved)
+        
+        if kind == "swap":
+            legs = params.get("legs")
+            if legs is None:
+                legs = [[params.get("token_in"), params.get("token_out"), params.get("amount")]]
+            if not isinstance(legs, list) or not legs:
+                raise ValueError("swap: legs must be a non-empty list")
+            normalized = []
+            for leg in legs:
+                if not isinstance(leg, (list, tuple)) or len(leg) != 3:
+                    raise ValueError("swap: each leg must be [token_in, token_out, amount]")
+                token_in, token_out = token(leg[0], "token_in"), token(leg[1], "token_out")
+                if token_in == token_out:
+                    raise ValueError("swap: token_in and token_out must differ")
+                normalized.append([token_in, token_out, amount(2, leg)])
+            return {"legs": normalized}
+        if kind == "liquidity":
+            return {
+                "token_a": token(params.get("token_a"), "token_a"),
+                "token_b": token(params.get("token_b"), "token_b"),
+                "amount_a": amount("amount_a"),
+                "amount_b": amount("amount_b")
+            }
+        if kind == "lock":
+            return {"amount": amount("amount"), "lock_days": integer("lock_days", 1)}
+        if kind == "vote":
+            gauge = params.get("gauge", self.config["gauge_address"])
+            if not isinstance(gauge, str) or not Web3.is_address(gauge):
+                raise ValueError("vote: gauge must be an address")
+            return {"weight": integer("weight", 0), "gauge": Web3.to_checksum_address(gauge)}
+        return {"amount": amount("amount")}
+
+    def enqueue_job(self, kind, wallet, params, priority=0, dedupe_key=None, max_attempts=None):
+        return self.jobs.enqueue(*self.prepare_job(kind, wallet, params, priority, dedupe_key, max_attempts))
+
+    async def execute_job(self, job):
+        private_key = self.wallets.get(job["wallet"])
+        if private_key is None:
+            return {"success": False, "error": f"Wallet {job['wallet']} is not loaded"}
+        
+        params = job["params"]
+        kind = job["kind"]
+        if kind == "swap":
+            legs = params.get("legs") or [[params["token_in"], params["token_out"], params["amount"]]]
+            return await self.perform_batch_swap(private_key, [
+                (self.parse_token_input(token_in), self.parse_token_input(token_out), float(amount))
+                for token_in, token_out, amount in legs
+            ])
+        if kind == "liquidity":
+            return await self.add_liquidity(
+                private_key,
+                self.parse_token_input(params["token_a"]),
+                self.parse_token_input(params["token_b"]),
+                float(params["amount_a"]),
+                float(params["amount_b"])
+            )
+        if kind == "lock":
+            return await self.convert_to_vesuma(private_key, float(params["amount"]), int(params["lock_days"]))
+        if kind == "stake":
+            return await self.stake_vesuma(private_key, float(params["amount"]))
+        if kind == "vote":
+            return await self.vote_with_vesuma(private_key, params.get("gauge", self.config["gauge_address"]), int(params["weight"]))
+        if kind == "wrap":
+            return await self.perform_wrap(private_key, float(params["amount"]))
+        if kind == "unwrap":
+            return await self.perform_unwrap(private_key, float(params["amount"]))
+        return {"success": False, "error": f"Unknown job kind: {kind}"}
+
+    async def run_job_workers(self, worker_count=None, stop_when_idle=True, stop_event=None, dedupe_prefix=None):
+        # dedupe_prefix restricts the workers to one group of jobs, e.g. a single plan run
+        worker_count = worker_count or self.config["job_workers"]
+        counts = self.jobs.counts(dedupe_prefix)
+        log.info(f"Processing job queue with {worker_count} worker(s): {counts.get('queued', 0)} queued")
+        
+        # Same fleet-wide pacing as automated swaps
+        rate_limiter = TokenBucket(self.config["target_tx_per_minute"], self.config["rate_burst"])
+        await asyncio.gather(*[
+            self.job_worker(rate_limiter, stop_when_idle, stop_event, dedupe_prefix) for _ in range(worker_count)
+        ])
+        
+        counts = self.jobs.counts(dedupe_prefix)
+        log.success(f"Job queue {'drained' if stop_when_idle else 'stopped'}: {counts.get('done', 0)} done, {counts.get('dead', 0)} dead-lettered")
+
+    async def job_worker(self, rate_limiter, stop_when_idle, stop_event=None, dedupe_prefix=None):
+        # With a stop_event the worker finishes its current job and exits once it is set
+        while stop_event is None or not stop_event.is_set():
+            job = self.jobs.claim(dedupe_prefix)
+            if job is None:
+                counts = self.jobs.counts(dedupe_prefix)
+                if stop_when_idle and not counts.get("queued") and not counts.get("running"):
+                    return
+                await asyncio.sleep(self.config["block_poll_interval"])
                 continue
+            
+            await rate_limiter.acquire()
+            address = job["wallet"]
+            log.info(f"[{address[:10]}] Job {job['id']}: {job['kind']} (attempt {job['attempts']}/{job['max_attempts']})")
+            try:
+                result = await self.execute_job(job)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            
+            try:
+                if result["success"]:
+                    self.jobs.complete(job["id"], result)
+                    status = "done"
+                    log.success(f"[{address[:10]}] Job {job['id']} done")
+                else:
+                    status = self.jobs.fail(job, result.get("error", "Unknown error"))
+                    if status == "dead":
+                        log.error(f"[{address[:10]}] Job {job['id']} dead-lettered: {result.get('error', 'Unknown error')}")
+                    else:
+                        log.warn(f"[{address[:10]}] Job {job['id']} failed, will retry: {result.get('error', 'Unknown error')}")
+            except Exception as e:
+                # A row the queue cannot process is dead-lettered instead of taking the worker down
+                log.error(f"[{address[:10]}] Job {job['id']} could not be updated, dead-lettering: {str(e)}")
+                status = "dead"
+                try:
+                    self.jobs.bury(job["id"], f"{result.get('error') or 'bookkeeping failed'}; {str(e)}")
+                except Exception as e:
+                    log.error(f"Job queue error: {str(e)}")
+            
+            if self.control_server:
+                self.control_server.publish({
+                    "event": "job",
+                    "id": job["id"],
+                    "kind": job["kind"],
+                    "wallet": address,
+                    "status": status,
+                    "attempt": job["attempts"],
+                    "result": result
+                })
+
+    async def run_daemon(self):
+        # Long-running mode: connections, caches and nonce state stay warm while jobs arrive over the control API
+        self.control_server = ControlServer(
+            self, self.config["daemon_host"], self.config["daemon_port"], os.getenv("SATSUMA_API_TOKEN")
+        )
+        await self.control_server.start()
         
-        log.success("Automated swaps completed!")
-        log.info(f"Total: {self.settings['total_transactions']}, Success: {self.settings['successful_transactions']}, Failed: {self.settings['failed_transactions']}")
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_name in ("SIGINT", "SIGTERM"):
+            try:
+                loop.add_signal_handler(getattr(signal, signal_name), stop_event.set)
+            except (NotImplementedError, AttributeError):
+                pass
+        
+        try:
+            await self.run_job_workers(stop_when_idle=False, stop_event=stop_event)
+        finally:
+            await self.control_server.stop()
+            self.control_server = None
+            log.info("Daemon stopped")
+
+    def select_wallets(self, specs, default_all=False):
+        # specs: addresses, 1-based indexes or "all"; nothing selects the first wallet (or all with default_all)
+        addresses = list(self.wallets)
+        if not specs:
+            return addresses if default_all else addresses[:1]
+        
+        selected = []
+        for spec in specs:
+            spec = str(spec).strip()
+            if spec.lower() == "all":
+                candidates = addresses
+            elif spec.isdigit():
+                index = int(spec)
+                if not 1 <= index <= len(addresses):
+                    raise ValueError(f"Wallet index {index} out of range (1-{len(addresses)})")
+                candidates = [addresses[index - 1]]
+            else:
+                address = Web3.to_checksum_address(spec)
+                if address not in self.wallets:
+                    raise ValueError(f"Unknown wallet: {address}")
+                candidates = [address]
+            selected.extend(address for address in candidates if address not in selected)
+        return selected
+
+    async def run_cli(self, args):
+        # Returns the process exit code
+        if args.command == "balances":
+            await self.show_balances()
+            return 0
+        
+        if args.command == "auto":
+            if args.count and args.count != self.settings["transaction_count"]:
+                self.settings["transaction_count"] = args.count
+                self.settings["wallet_progress"] = {}
+                self.settings["current_round"] = 0
+                self.save_user_settings()
+            await self.start_automated_swaps()
+            return 0
+        
+        if args.command == "plan":
+            return await self.run_plan(args.file, args.run_id)
+        
+        if args.command == "daemon":
+            await self.run_daemon()
+            return 0
+        
+        kind, params = CLI_OPERATIONS[args.command](args)
+        try:
+            wallets = self.select_wallets(args.wallet)
+            params = self.normalize_job_params(kind, params)
+        except ValueError as e:
+            log.error(str(e))
+            return 2
+        semaphore = asyncio.Semaphore(self.config["max_concurrent_wallets"])
+        
+        async def run_for_wallet(address):
+            async with semaphore:
+                return await self.execute_job({"kind": kind, "wallet": address, "params": params})
+        
+        results = await asyncio.gather(*[run_for_wallet(address) for address in wallets])
+        for address, result in zip(wallets, results):
+            if result["success"]:
+                log.success(f"[{address[:10]}] {args.command} succeeded: {result.get('tx_hash')}")
+            else:
+                log.error(f"[{address[:10]}] {args.command} failed: {result.get('error', 'Unknown error')}")
+        return 0 if all(result["success"] for result in results) else 1
+
+    def plan_run_id(self, plan, content):
+        # Runs of the same plan content are numbered: an unfinished run (queued, running or dead-lettered jobs) is
+        # resumed, a finished one makes the next invocation start run n+1; editing the plan starts a new series
+        base = f"{plan.get('name') or 'plan'}-{keccak(content).hex()[:8]}"
+        latest_key = self.jobs.latest_key(f"plan:{base}#")
+        if latest_key is None:
+            return f"{base}#1"
+        latest = int(latest_key[len(f"plan:{base}#"):].split(":", 1)[0])
+        counts = self.jobs.counts(f"plan:{base}#{latest}:")
+        finished = not any(counts.get(status) for status in ("queued", "running", "dead"))
+        return f"{base}#{latest + 1 if finished else latest}"
+
+    async def run_plan(self, path, run_id=None):
+        # Each step becomes a queued job per wallet; dedupe keys make re-running the same plan resume it
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            if path.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise Exception("YAML plans need PyYAML (pip install pyyaml)")
+                plan = yaml.safe_load(content)
+            else:
+                plan = json.loads(content)
+            
+            workers = plan.get("workers")
+            if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+                raise Exception("workers must be a positive integer")
+            
+            run_id = run_id or self.plan_run_id(plan, content)
+            prefix = f"plan:{run_id}:"
+            wallets = self.select_wallets(plan.get("wallets"), default_all=True)
+            
+            # The whole plan is validated before anything is queued, so a bad step leaves no partial run behind
+            jobs = []
+            for step_index, step in enumerate(plan["steps"]):
+                params = dict(step)
+                kind = PLAN_KINDS.get(params.pop("kind", None))
+                if kind is None:
+                    raise Exception(f"Step {step_index + 1}: unknown kind {step.get('kind')}")
+                try:
+                    repeat = int(params.pop("repeat", 1))
+                    priority = int(params.pop("priority", plan.get("priority", 0)))
+                    for address in wallets:
+                        for repetition in range(repeat):
+                            jobs.append(self.prepare_job(kind, address, params, priority, f"{prefix}{address}:{step_index}:{repetition}"))
+                except ValueError as e:
+                    raise Exception(f"Step {step_index + 1}: {str(e)}")
+        except Exception as e:
+            log.error(f"Invalid plan {path}: {str(e)}")
+            return 2
+        
+        created = sum(self.jobs.enqueue(*job)[1] for job in jobs)
+        log.info(f"Plan {run_id}: {len(jobs)} job(s) across {len(wallets)} wallet(s), {created} new, {len(jobs) - created} already queued or done")
+        
+        # Resuming a plan retries the steps a previous run dead-lettered
+        requeued = self.jobs.retry_dead(prefix)
+        if requeued:
+            log.warn(f"Plan {run_id}: retrying {requeued} previously dead-lettered job(s)")
+        
+        await self.run_job_workers(workers, dedupe_prefix=prefix)
+        
+        counts = self.jobs.counts(prefix)
+        log.info(f"Plan {run_id}: {counts.get('done', 0)} done, {counts.get('dead', 0)} dead-lettered")
+        return 0 if not counts.get("dead") else 1
 
     def display_welcome_screen(self):
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -1426,24 +3853,16 @@ class SatsumaBot:
         print(f"{Colors.YELLOW}9. Unwrap WCBTC to cBTC{Colors.RESET}")
         print(f"{Colors.YELLOW}10. Show Balances{Colors.RESET}")
         print(f"{Colors.YELLOW}11. Transaction History{Colors.RESET}")
-        print(f"{Colors.YELLOW}12. Exit{Colors.RESET}")
+        print(f"{Colors.YELLOW}12. Process Job Queue{Colors.RESET}")
+        print(f"{Colors.YELLOW}13. Exit{Colors.RESET}")
         print(f"{Colors.YELLOW}{'='*35}{Colors.RESET}")
 
     async def show_balances(self):
         try:
-            account = self.w3.eth.account.from_key(self.private_keys[0])
-            
-            log.info(f"Showing balances for {account.address}")
+            addresses = [self.w3.eth.account.from_key(key).address for key in self.private_keys]
             
-            # Get ETH balance
-            eth_balance = self.w3.eth.get_balance(account.address)
-            eth_formatted = self.w3.from_wei(eth_balance, 'ether')
+            log.info(f"Showing balances for {len(addresses)} wallet(s)")
             
-            print(f"\n{Colors.CYAN}=== Account Balances ==={Colors.RESET}")
-            print(f"{Colors.WHITE}Address: {account.address}{Colors.RESET}")
-            print(f"{Colors.GREEN}cBTC Balance: {eth_formatted:.6f} cBTC{Colors.RESET}")
-            
-            # Get token balances
             tokens = {
                 "USDC": self.config["usdc_address"],
                 "WCBTC": self.config["wcbtc_address"],
@@ -1451,35 +3870,88 @@ class SatsumaBot:
                 "S33": self.config["s33_address"]
             }
             
-            for symbol, address in tokens.items():
-                balance_info = await self.get_token_balance(address, account.address)
-                if balance_info:
-                    print(f"{Colors.GREEN}{symbol} Balance: {balance_info['formatted']:.6f} {balance_info['symbol']}{Colors.RESET}")
+            # Native and token balances for the whole fleet in aggregated reads
+            balances, metadata = await asyncio.gather(
+                self.reader.get_balances(addresses, list(tokens.values())),
+                self.token_registry.get_many(list(tokens.values()))
+            )
+            
+            for address in addresses:
+                print(f"\n{Colors.CYAN}=== Account Balances ==={Colors.RESET}")
+                print(f"{Colors.WHITE}Address: {address}{Colors.RESET}")
+                
+                eth_balance = balances[address]["native"]
+                if eth_balance is not None:
+                    print(f"{Colors.GREEN}cBTC Balance: {self.w3.from_wei(eth_balance, 'ether'):.6f} cBTC{Colors.RESET}")
                 else:
-                    print(f"{Colors.RED}{symbol} Balance: Error fetching balance{Colors.RESET}")
+                    print(f"{Colors.RED}cBTC Balance: Error fetching balance{Colors.RESET}")
+                
+                for symbol, token_address in tokens.items():
+                    balance = balances[address][token_address]
+                    token_info = metadata[token_address]
+                    # Seeded tokens carry only a symbol until their decimals have been resolved
+                    if balance is not None and token_info and "decimals" in token_info:
+                        print(f"{Colors.GREEN}{symbol} Balance: {balance / (10 ** token_info['decimals']):.6f} {token_info.get('symbol', symbol)}{Colors.RESET}")
+                    else:
+                        print(f"{Colors.RED}{symbol} Balance: Error fetching balance{Colors.RESET}")
             
             print(f"{Colors.CYAN}{'='*35}{Colors.RESET}")
             
         except Exception as e:
             log.error(f"Error showing balances: {str(e)}")
 
-    def show_transaction_history(self):
-        if not self.transaction_history:
+    async def show_transaction_history(self):
+        # Optional filters, blank means any
+        filters = {
+            "wallet": (await ainput("Filter by wallet address (blank for all): ")).strip() or None,
+            "tx_type": (await ainput("Filter by type (blank for all): ")).strip().lower() or None,
+            "status": (await ainput("Filter by status success/failed/error (blank for all): ")).strip().lower() or None
+        }
+        if filters["wallet"]:
+            filters["wallet"] = Web3.to_checksum_address(filters["wallet"])
+        
+        total = self.history.count(**filters)
+        if not total:
             log.info("No transaction history available")
             return
         
-        print(f"\n{Colors.CYAN}=== Transaction History ==={Colors.RESET}")
+        print(f"\n{Colors.CYAN}=== Transaction History ({total}) ==={Colors.RESET}")
         
-        for i, tx in enumerate(self.transaction_history[-10:], 1):  # Show last 10 transactions
-            status_color = Colors.GREEN if tx["status"] == "success" else Colors.RED
-            print(f"{Colors.WHITE}{i}. {tx['type'].upper()}{Colors.RESET}")
-            print(f"   Status: {status_color}{tx['status']}{Colors.RESET}")
-            print(f"   Hash: {Colors.CYAN}{tx['tx_hash']}{Colors.RESET}")
-            print(f"   Time: {Colors.YELLOW}{tx['timestamp']}{Colors.RESET}")
-            print()
+        shown = 0
+        for page in self.history.pages(10, **filters):
+            for tx in page:
+                shown += 1
+                status_color = Colors.GREEN if tx["status"] == "success" else Colors.RED
+                print(f"{Colors.WHITE}{shown}. {tx['type'].upper()}{Colors.RESET}")
+                print(f"   Status: {status_color}{tx['status']}{Colors.RESET}")
+                print(f"   Wallet: {Colors.WHITE}{tx['wallet']}{Colors.RESET}")
+                if tx["tx_hash"]:
+                    print(f"   Hash: {Colors.CYAN}{tx['tx_hash']}{Colors.RESET}")
+                if tx["block_number"] is not None:
+                    print(f"   Block: {tx['block_number']}  Gas used: {tx['gas_used']}  Latency: {tx['latency']:.1f}s")
+                if tx["error"]:
+                    print(f"   Error: {Colors.RED}{tx['error']}{Colors.RESET}")
+                print(f"   Time: {Colors.YELLOW}{datetime.fromtimestamp(tx['timestamp']).isoformat(timespec='seconds')}{Colors.RESET}")
+                print()
+            
+            if shown >= total or (await ainput(f"Showing {shown}/{total}, press Enter for more or q to stop: ")).strip().lower() == "q":
+                break
         
         print(f"{Colors.CYAN}{'='*35}{Colors.RESET}")
 
+    def parse_token_input(self, value):
+        # Accepts an address, a configured token symbol, or the native coin
+        value = value.strip()
+        if value.lower() in (NATIVE_TOKEN, self.config["symbol"].lower()):
+            return NATIVE_TOKEN
+        symbols = {
+            "usdc": self.config["usdc_address"],
+            "wcbtc": self.config["wcbtc_address"],
+            "suma": self.config["suma_address"],
+            "s33": self.config["s33_address"]
+        }
+        return symbols.get(value.lower(), value)
+
     async def handle_menu_option(self, option):
         try:
             if option == "1":
@@ -1487,9 +3959,12 @@ class SatsumaBot:
             
             elif option == "2":
                 try:
-                    count = int(input("Enter transaction count: "))
+                    count = int(await ainput("Enter transaction count: "))
                     if count > 0:
                         self.settings["transaction_count"] = count
+                        # A new plan starts a fresh run instead of resuming the old one
+                        self.settings["wallet_progress"] = {}
+                        self.settings["current_round"] = 0
                         self.save_user_settings()
                         log.success(f"Transaction count set to {count}")
                     else:
@@ -1504,12 +3979,13 @@ class SatsumaBot:
                 print(f"WCBTC: {self.config['wcbtc_address']}")
                 print(f"SUMA: {self.config['suma_address']}")
                 print(f"S33: {self.config['s33_address']}")
+                print(f"{self.config['symbol']} (native): {NATIVE_TOKEN}")
                 
-                token_in = input("Enter token in address: ").strip()
-                token_out = input("Enter token out address: ").strip()
+                token_in = self.parse_token_input(await ainput("Enter token in address: "))
+                token_out = self.parse_token_input(await ainput("Enter token out address: "))
                 
                 try:
-                    amount = float(input("Enter amount: "))
+                    amount = float(await ainput("Enter amount: "))
                     if amount > 0:
                         result = await self.perform_swap(self.private_keys[0], token_in, token_out, amount)
                         if result["success"]:
@@ -1527,12 +4003,12 @@ class SatsumaBot:
                 print(f"USDC: {self.config['usdc_address']}")
                 print(f"WCBTC: {self.config['wcbtc_address']}")
                 
-                token_a = input("Enter token A address: ").strip()
-                token_b = input("Enter token B address: ").strip()
+                token_a = (await ainput("Enter token A address: ")).strip()
+                token_b = (await ainput("Enter token B address: ")).strip()
                 
                 try:
-                    amount_a = float(input("Enter amount A: "))
-                    amount_b = float(input("Enter amount B: "))
+                    amount_a = float(await ainput("Enter amount A: "))
+                    amount_b = float(await ainput("Enter amount B: "))
                     
                     if amount_a > 0 and amount_b > 0:
                         result = await self.add_liquidity(self.private_keys[0], token_a, token_b, amount_a, amount_b)
@@ -1549,8 +4025,8 @@ class SatsumaBot:
                 print(f"\n{Colors.CYAN}=== Convert SUMA to veSUMA ==={Colors.RESET}")
                 
                 try:
-                    amount = float(input("Enter SUMA amount: "))
-                    lock_days = int(input("Enter lock time (days): "))
+                    amount = float(await ainput("Enter SUMA amount: "))
+                    lock_days = int(await ainput("Enter lock time (days): "))
                     
                     if amount > 0 and lock_days > 0:
                         result = await self.convert_to_vesuma(self.private_keys[0], amount, lock_days)
@@ -1567,7 +4043,7 @@ class SatsumaBot:
                 print(f"\n{Colors.CYAN}=== Stake veSUMA ==={Colors.RESET}")
                 
                 try:
-                    amount = float(input("Enter veSUMA amount: "))
+                    amount = float(await ainput("Enter veSUMA amount: "))
                     
                     if amount > 0:
                         result = await self.stake_vesuma(self.private_keys[0], amount)
@@ -1583,9 +4059,9 @@ class SatsumaBot:
             elif option == "7":
                 print(f"\n{Colors.CYAN}=== Vote with veSUMA ==={Colors.RESET}")
                 
-                gauge_address = input("Enter gauge address: ").strip()
+                gauge_address = (await ainput("Enter gauge address: ")).strip()
                 try:
-                    weight = int(input("Enter vote weight: "))
+                    weight = int(await ainput("Enter vote weight: "))
                     
                     if weight > 0:
                         result = await self.vote_with_vesuma(self.private_keys[0], gauge_address, weight)
@@ -1601,7 +4077,7 @@ class SatsumaBot:
             elif option == "8":
                 print(f"\n{Colors.CYAN}=== Wrap cBTC to WCBTC ==={Colors.RESET}")
                 try:
-                    amount = float(input("Enter cBTC amount to wrap: "))
+                    amount = float(await ainput("Enter cBTC amount to wrap: "))
                     if amount > 0:
                         result = await self.perform_wrap(self.private_keys[0], amount)
                         if result["success"]:
@@ -1616,7 +4092,7 @@ class SatsumaBot:
             elif option == "9":
                 print(f"\n{Colors.CYAN}=== Unwrap WCBTC to cBTC ==={Colors.RESET}")
                 try:
-                    amount = float(input("Enter WCBTC amount to unwrap: "))
+                    amount = float(await ainput("Enter WCBTC amount to unwrap: "))
                     if amount > 0:
                         result = await self.perform_unwrap(self.private_keys[0], amount)
                         if result["success"]:
@@ -1632,14 +4108,21 @@ class SatsumaBot:
                 await self.show_balances()
             
             elif option == "11":
-                self.show_transaction_history()
+                await self.show_transaction_history()
             
             elif option == "12":
+                counts = self.jobs.counts()
+                log.info(f"Job queue: {counts.get('queued', 0)} queued, {counts.get('done', 0)} done, {counts.get('dead', 0)} dead")
+                if counts.get("dead") and (await ainput("Retry dead-lettered jobs? (y/N): ")).strip().lower() == "y":
+                    log.info(f"Requeued {self.jobs.retry_dead()} job(s)")
+                await self.run_job_workers()
+            
+            elif option == "13":
                 log.info("Exiting Satsuma Bot...")
                 return False
             
             else:
-                log.error("Invalid option. Please choose 1-12.")
+                log.error("Invalid option. Please choose 1-13.")
         
         except Exception as e:
             log.error(f"Unexpected error: {str(e)}")
@@ -1653,7 +4136,7 @@ class SatsumaBot:
         while True:
             try:
                 self.display_menu()
-                choice = input(f"{Colors.WHITE}[➤] Select option (1-12): {Colors.RESET}").strip()
+                choice = (await ainput(f"{Colors.WHITE}[➤] Select option (1-13): {Colors.RESET}")).strip()
                 
                 if not choice:
                     continue
@@ -1662,16 +4145,94 @@ class SatsumaBot:
                 if not should_continue:
                     break
                 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+                # Ctrl+C cancels the pending prompt; a closed stdin ends the menu too
                 log.info("\nBot stopped by user")
                 break
             except Exception as e:
                 log.error(f"Unexpected error: {str(e)}")
                 continue
 
+# Subcommand -> (job kind, job params), shared by the CLI and the job queue
+CLI_OPERATIONS = {
+    "swap": lambda args: ("swap", {"token_in": args.token_in, "token_out": args.token_out, "amount": args.amount}),
+    "add-liquidity": lambda args: ("liquidity", {"token_a": args.token_a, "token_b": args.token_b, "amount_a": args.amount_a, "amount_b": args.amount_b}),
+    "lock": lambda args: ("lock", {"amount": args.amount, "lock_days": args.days}),
+    "stake": lambda args: ("stake", {"amount": args.amount}),
+    "vote": lambda args: ("vote", {"weight": args.weight, **({"gauge": args.gauge} if args.gauge else {})}),
+    "wrap": lambda args: ("wrap", {"amount": args.amount}),
+    "unwrap": lambda args: ("unwrap", {"amount": args.amount})
+}
+
+# Step kinds accepted in plan files
+PLAN_KINDS = {kind: kind for kind in JobQueue.KINDS}
+PLAN_KINDS["add-liquidity"] = "liquidity"
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Satsuma DeFi bot for Citrea testnet. Without a command the interactive menu starts.")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    def operation(name, help_text):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("-w", "--wallet", action="append", help="wallet address, 1-based index or 'all' (repeatable, default: first wallet)")
+        return subparser
+    
+    swap = operation("swap", "swap tokens through the router")
+    swap.add_argument("token_in", help="token address, symbol (USDC, WCBTC, SUMA, S33) or cBTC")
+    swap.add_argument("token_out", help="token address, symbol (USDC, WCBTC, SUMA, S33) or cBTC")
+    swap.add_argument("amount", type=float)
+    
+    liquidity = operation("add-liquidity", "add liquidity to a pool")
+    liquidity.add_argument("token_a")
+    liquidity.add_argument("token_b")
+    liquidity.add_argument("amount_a", type=float)
+    liquidity.add_argument("amount_b", type=float)
+    
+    lock = operation("lock", "lock SUMA into veSUMA")
+    lock.add_argument("amount", type=float)
+    lock.add_argument("days", type=int)
+    
+    stake = operation("stake", "stake veSUMA")
+    stake.add_argument("amount", type=float)
+    
+    vote = operation("vote", "vote with veSUMA")
+    vote.add_argument("weight", type=int)
+    vote.add_argument("--gauge", help="gauge address (default from config)")
+    
+    wrap = operation("wrap", "wrap cBTC to WCBTC")
+    wrap.add_argument("amount", type=float)
+    
+    unwrap = operation("unwrap", "unwrap WCBTC to cBTC")
+    unwrap.add_argument("amount", type=float)
+    
+    subparsers.add_parser("balances", help="show balances of all wallets")
+    
+    auto = subparsers.add_parser("auto", help="run automated swaps across all wallets")
+    auto.add_argument("--count", type=int, help="transactions per wallet (default: saved setting)")
+    
+    plan = subparsers.add_parser("plan", help="run a JSON or YAML plan file")
+    plan.add_argument("file")
+    plan.add_argument("--run-id", help="run the plan again under a new id instead of resuming")
+    
+    subparsers.add_parser("daemon", help="run headless with the local control API")
+    return parser
+
 async def main():
-    bot = SatsumaBot()
-    await bot.run()
+    args = build_arg_parser().parse_args()
+    bot = SatsumaBot(interactive=args.command is None)
+    await bot.connect()
+    exit_code = 0
+    try:
+        if args.command is None:
+            await bot.run()
+        else:
+            exit_code = await bot.run_cli(args)
+    finally:
+        await bot.close()
+    return exit_code
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        sys.exit(130)